@@ -8,6 +8,10 @@ A strategy profile is an array of strategies. """
 from openopt import SNLE
 import numpy as np
 import time
+from bimatrix import nash_bimatrix
+from game import Game
+import iterative
+import profiling
 start_time = time.time()
 
 #these are the payoffs from the game table; 
@@ -21,6 +25,11 @@ payoffs = np.array([[[0,0],[1,3]],[[3,1],[1,1]]])
 ##example for 3 players with P1 having 3 actions, P2 and P3 having 2 actions
 #payoffs = np.array([[[[0,0,0],[1,3,0],[1,1,1]],[[3,1,0],[1,1,0],[1,1,1]]],[[[0,0,0],[1,3,0],[1,1,1]],[[3,1,0],[1,1,0],[1,1,1]]]] ) 
 
+#the equation solver is too slow for large games; with large = True, approximate equilibria are
+#computed with an iterative method ('fp','replicator' or 'regret') from many random starting points (see iterative.py)
+large = False
+large_method = 'fp'
+
 dim = payoffs.shape
 
 n = payoffs.ndim-1#number of players
@@ -30,51 +39,8 @@ for i in dim[:-1]:
     no_a.append(i)
 no_a = no_a[::-1]
     
-#gets numpy array of likelihoods of action profiles (from players 0..i-1) and strategy of player i, 
-#returns likelihoods of action profiles for players up to i
-def help(probmatrix, strati):
-    new = np.array([probmatrix*prob for prob in strati])
-    return new
-
-#returns the expected payoff of player i from playing ai if others play mixed strategies stratmini
-def EUi(stratmini,ai,i):
-    j = n-1#the next few lines define a list of slice object to extract i's payoffs when he plays ai from the payoff matrix; 
-    #recall that the first index denotes the action of the last player in payoffs!
-    obj = ()
-    while j>i:
-        obj = obj + (slice(0,None,1),)
-        j = j-1
-    obj = obj + (slice(ai,ai+1,1),)
-    j = j-1
-    while j>=0:
-        obj = obj + (slice(0,None ,1),)
-        j = j-1
-    obj = obj + (slice(i,i+1,1),)
-    payoffi = payoffs[obj]
-    temp = np.array([1.])#constructs probability matrix, giving probabilities of action profiles of other players
-    for stratj in stratmini:
-        temp = help(temp,stratj)
-    return np.dot(temp.flatten(),payoffi.flatten())
-    
-
-#This function takes a mixed strategy profile as argument.
-#The output is the Delta described above but it returns the Delta for all players as a flat(!)  numpy array.
-def Delta(strat):
-    i = 0
-    out = []
-    while i < n:
-        stratmini = strat[0:i] + strat[i+1:len(strat)]
-        uimax = -1000.0#assumes that all payoffs are above -1000.0
-        uilist = []
-        for action in range (no_a[i]):
-            uact = EUi(stratmini,action,i)
-            uilist.append(uact)
-            uimax = max(uimax,uact)
-        deltai = [item - uimax for item in uilist]
-        out.append(deltai)
-        i+=1
-    return np.array([item for sublist in out for item in sublist])
-
+game = Game(payoffs)#payoff tensors, best responses etc. are prepared once (see game.py)
+kernel = game.kernel()#expected payoffs against mixed strategies (see payoffkernel.py)
 
 no_a_np = np.array(no_a)
 total_no_a = no_a_np.sum()
@@ -93,23 +59,67 @@ for i in range(n):
     x0 = x0 + [1.0/no_a_i]*no_a_i
     actagg.append(actagg[i]+no_a_i)
 
-#multiplies the vectors strat and Delta(strat); this product has to be 0 in equilibrium
-def product(x):
-    strat = []
-    for i in range(n):
-        strat.append(x[actagg[i]:actagg[i+1]])
-    return np.dot(x,Delta(strat))
-
-p = SNLE(product,x0,lb=lb,ub=ub,Aeq=Aeq,beq=beq)
-p.iprint = -1
-r = p.solve('nssolve')
-
-if r.stopcase==1:
+#the equilibrium conditions as a vector valued system: x*Delta(x) has to be 0 in equilibrium (action by action);
+#its Jacobian is computed in closed form from the payoff tensors (see nash_system in payoffkernel.py), so the
+#solver does not need finite differences; the solver asks for both at the same point, so the last result is kept
+evaluations = {'conditions':0,'jacobian':0,'system':0}
+last = {}
+def system(x):
+    key = np.asarray(x,dtype=float).tostring()
+    if last.get('key') != key:
+        evaluations['system'] = evaluations['system'] + 1
+        last['key'] = key
+        last['F'], last['J'] = kernel.nash_system(x)
+    return last['F'], last['J']
+
+def conditions(x):
+    evaluations['conditions'] = evaluations['conditions'] + 1
+    return system(x)[0]
+
+def jacobian(x):
+    evaluations['jacobian'] = evaluations['jacobian'] + 1
+    return system(x)[1]
+
+if n==2:#two player games are solved exactly, the method is chosen according to the size of the game (see bimatrix.py)
+    equilibria = nash_bimatrix(game)
+    print 'the game has (at least) the following',len(equilibria),'equilibria'
+    for eq in equilibria:
+        print 'there is an equilibrium in which '
+        for i in range(n):
+            out = [round(item,3) for item in eq[i]]
+            print 'player',i,'uses the mixed strategy',out
+elif len(game.pure_nash())>0:#a pure equilibrium is found without the solver
     print 'there is an equilibrium in which '
     for i in range(n):
-        out = [round(item,3) for item in r.xf[actagg[i]:actagg[i+1]]]
+        out = [round(item,3) for item in game.pure_profile(game.pure_nash()[0])[i]]
         print 'player',i,'uses the mixed strategy',out
+elif large:
+    equilibria, runs = iterative.solve(game,large_method,restarts=16,processes=None,tol=5e-2)
+    if len(equilibria)>0:
+        print 'the following',len(equilibria),'approximate equilibria were found (largest gain from deviating: %.5f)' % runs['exploitability'][runs['converged']].max()
+    else:
+        print 'no approximate equilibrium was found'
+    for eq in equilibria:
+        print 'there is an equilibrium in which '
+        for i in range(n):
+            out = [round(item,3) for item in eq[i]]
+            print 'player',i,'uses the mixed strategy',out
 else:
-    print 'Error: solver cannot find an equilibrium'
+    p = SNLE(conditions,x0,df=jacobian,lb=lb,ub=ub,Aeq=Aeq,beq=beq)
+    p.iprint = -1
+    solve_time = time.time()
+    with profiling.timer('snle_solve'):
+        r = p.solve('nssolve')
+    print 'the solver evaluated the conditions %d times and the Jacobian %d times (%d payoff evaluations) in %.3f seconds' % (evaluations['conditions'],evaluations['jacobian'],evaluations['system'],time.time() - solve_time)
+
+    if r.stopcase==1:
+        print 'there is an equilibrium in which '
+        for i in range(n):
+            out = [round(item,3) for item in r.xf[actagg[i]:actagg[i+1]]]
+            print 'player',i,'uses the mixed strategy',out
+    else:
+        print 'Error: solver cannot find an equilibrium'
 
 print("--- %s seconds ---" % (time.time() - start_time))
+if profiling.enabled:#set the environment variable GT_PROFILE=1 to see where the time goes
+    print profiling.report()
@@ -0,0 +1,137 @@
+
+from collections import deque
+import numpy as np
+
+def assignment(sc,match):
+    """returns the assigned school of every student (-1 if unmatched) and the position of this school in the student's preference list (length of the list if unmatched)"""
+    pref_arr, pref_len, prank_arr = sc.arrays()
+    assigned = np.full(sc.nstud,-1)
+    for k in range(len(match)):
+        assigned[match[k]] = k
+    pos = np.array(pref_len,dtype=np.int64)
+    matched = assigned >= 0
+    pos[matched] = (pref_arr[matched] == assigned[matched][:,None]).argmax(1)
+    return assigned, pos
+
+class matchcheck:
+    def __init__(self,sc,match):
+        """prepares the analysis of match (list of lists as returned by gs, ttc or boston) in the school choice problem sc: every pair of a student and a school the student prefers to his assigned school is listed once (pair_stud, pair_school) together with the student's rank at this school (pair_rank)"""
+        self.sc = sc
+        self.match = match
+        pref_arr, pref_len, prank_arr = sc.arrays()
+        self.assigned, self.pos = assignment(sc,match)
+        better = np.arange(pref_arr.shape[1]) < self.pos[:,None]#schools a student prefers to his assigned school
+        self.pair_stud = np.nonzero(better)[0]#sorted by student
+        self.pair_school = pref_arr[better]
+        self.pair_rank = prank_arr[better]
+        matched = np.nonzero(self.assigned >= 0)[0]
+        self.matched_rank = prank_arr[matched,self.pos[matched]]#rank of matched students at their school
+        self.count = np.array([len(studs) for studs in match],dtype=np.int64)#number of students at each school
+        self.free = self.count < np.array(sc.capacity)
+        self.cutoff = np.full(sc.nschool,-1,dtype=np.int64)#students with a rank below the cutoff can get into the school
+        np.maximum.at(self.cutoff,self.assigned[matched],self.matched_rank)
+        self.cutoff[self.free] = sc.nstud
+    #
+    def blocking_pairs(self):
+        """returns an array with one row (student, school) for every blocking pair: the student prefers the school to his assigned school and the school has a free seat or admitted a student with lower priority"""
+        block = self.pair_rank < self.cutoff[self.pair_school]
+        return np.column_stack((self.pair_stud[block],self.pair_school[block]))
+    #
+    def justified_envy(self):
+        """returns the number of (student, student) pairs where the first student has justified envy of the second, i.e. prefers the second one's school and has higher priority there, and the number of students with justified envy"""
+        nstud = self.sc.nstud
+        keys = np.sort(self.assigned[self.assigned >= 0]*(nstud + 1) + self.matched_rank)#admitted students sorted by school and rank
+        end = np.cumsum(self.count)[self.pair_school]#end of the pair's school in keys
+        worse = end - np.searchsorted(keys,self.pair_school*(nstud + 1) + self.pair_rank,'right')#admitted students with lower priority
+        return int(worse.sum()), len(np.unique(self.pair_stud[worse > 0]))
+    #
+    def wasted_seats(self):
+        """returns the number of (student, school) pairs where the school has a free seat, the student is eligible and prefers it to his assigned school, and a dictionary with the number of free seats of every school that has such a pair"""
+        waste = self.free[self.pair_school] & (self.pair_rank < self.sc.nstud)
+        schools = np.unique(self.pair_school[waste])
+        return int(waste.sum()), dict((int(k),int(self.sc.capacity[k] - self.count[k])) for k in schools)
+    #
+    def pareto_cycles(self):
+        """returns a list of disjoint Pareto improving cycles; each cycle is a list of (student, school) pairs where every student prefers the school to his assigned school, is eligible there and gives up his seat to the next student of the cycle; an empty list means that no trade among students makes all of them weakly and some strictly better off"""
+        nstud = self.sc.nstud
+        nschool = self.sc.nschool
+        #graph with students 0..nstud-1 and schools nstud..nstud+nschool-1: students point to better schools at which they are eligible, schools to their students
+        eligible = self.pair_rank < nstud
+        pair_stud, pair_school = self.pair_stud[eligible], self.pair_school[eligible]
+        stud_start = np.searchsorted(pair_stud,np.arange(nstud + 1)).tolist()
+        by_school = np.argsort(pair_school,kind='mergesort')#predecessors of schools
+        school_start = np.searchsorted(pair_school[by_school],np.arange(nschool + 1)).tolist()
+        pred_school = pair_stud[by_school].tolist()
+        pair_school = (pair_school + nstud).tolist()
+        school_studs = [list(studs) for studs in self.match]
+        assigned = self.assigned.tolist()
+        outdeg = [stud_start[j + 1] - stud_start[j] for j in range(nstud)] + self.count.tolist()
+        alive = [True]*(nstud + nschool)
+        def successors(v):
+            if v < nstud:
+                return pair_school[stud_start[v]:stud_start[v + 1]]
+            return school_studs[v - nstud]
+        def predecessors(v):
+            if v < nstud:
+                return [assigned[v] + nstud] if assigned[v] >= 0 else []
+            return pred_school[school_start[v - nstud]:school_start[v - nstud + 1]]
+        def prune(queue):#removes nodes without living successor; they cannot be on a cycle
+            while queue:
+                v = queue.popleft()
+                for u in predecessors(v):
+                    if alive[u]:
+                        outdeg[u] = outdeg[u] - 1
+                        if outdeg[u] == 0:
+                            alive[u] = False
+                            queue.append(u)
+        queue = deque()
+        for v in range(nstud + nschool):
+            if outdeg[v] == 0:
+                alive[v] = False
+                queue.append(v)
+        prune(queue)
+        ptr = [0]*(nstud + nschool)#next successor to look at
+        onpath = [-1]*(nstud + nschool)
+        cycles = []
+        path = []
+        for start in range(nstud):
+            if not alive[start]:
+                continue
+            path.append(start)
+            onpath[start] = 0
+            while path:
+                v = path[-1]
+                if not alive[v]:
+                    onpath[v] = -1
+                    path.pop()
+                    continue
+                succ = successors(v)
+                while not alive[succ[ptr[v]]]:
+                    ptr[v] = ptr[v] + 1
+                w = succ[ptr[v]]
+                if onpath[w] == -1:
+                    onpath[w] = len(path)
+                    path.append(w)
+                    continue
+                cycle = path[onpath[w]:]
+                del path[onpath[w]:]
+                queue = deque()
+                for u in cycle:
+                    alive[u] = False
+                    onpath[u] = -1
+                    queue.append(u)
+                prune(queue)
+                first = 0 if cycle[0] < nstud else 1#cycle alternates between students and schools
+                cycle = cycle[first:] + cycle[:first]
+                cycles.append([(cycle[i],cycle[i + 1] - nstud) for i in range(0,len(cycle),2)])
+        return cycles
+    #
+    def report(self):
+        """returns a dictionary with all results: blocking pairs, justified envy, wasted seats, Pareto improving cycles and whether the match is stable (no blocking pair) and Pareto efficient (no wasted seat and no improving cycle)"""
+        blocking = self.blocking_pairs()
+        envy, envious = self.justified_envy()
+        waste, wasted = self.wasted_seats()
+        cycles = self.pareto_cycles()
+        return {'blocking_pairs':blocking,'justified_envy':envy,'envious_students':envious,
+                'wasted_pairs':waste,'wasted_seats':wasted,'pareto_cycles':cycles,
+                'stable':len(blocking) == 0,'efficient':waste == 0 and cycles == []}
@@ -0,0 +1,166 @@
+""" Reproducible benchmarks of the game solvers and the matching mechanisms.
+Every case is run in a fresh worker process (so the peak memory of one case does not hide the next)
+with a fixed seed; the best time of a few repetitions, the peak memory and the profiling timers and
+counters (see profiling.py) are written to a JSON file and compared with a stored baseline.
+Usage: python benchmark.py [baseline] """
+
+import os
+import sys
+import json
+import time
+import random
+import resource
+import platform
+import multiprocessing
+import numpy as np
+import profiling
+
+CASES = [('bimatrix',{'actions':(8,8)}),
+         ('bimatrix',{'actions':(12,12)}),
+         ('correlated',{'actions':(6,6,6)}),
+         ('correlated',{'actions':(10,10,10)}),
+         ('dominance',{'actions':(40,40,40)}),
+         ('iterative',{'actions':(10,10,10),'method':'fp'}),
+         ('iterative',{'actions':(10,10,10),'method':'regret'}),
+         ('gs',{'nschool':10,'nstud':1000}),
+         ('gs',{'nschool':100,'nstud':10000}),
+         ('ttc',{'nschool':10,'nstud':1000}),
+         ('ttc',{'nschool':100,'nstud':10000}),
+         ('boston',{'nschool':10,'nstud':1000}),
+         ('boston',{'nschool':100,'nstud':10000}),
+         ('gen_sc',{'nschool':100,'nstud':10000}),
+         ('gen_sc_fast',{'nschool':100,'nstud':10000}),
+         ('gen_sc_fast',{'nschool':10,'nstud':1000000}),
+         ('gs_update',{'nschool':100,'nstud':100000,'listlen':10,'change':'capacity'}),
+         ('gs_update',{'nschool':1000,'nstud':100000,'listlen':10,'change':'capacity'}),
+         ('gs_update',{'nschool':100,'nstud':100000,'listlen':10,'change':'preference'})]
+COUNTERS = ('gs_update_full',)#counters that must not grow against the baseline (e.g. updates that fall back to a full run)
+
+def case_key(kind,params):
+    """name of a case in the output, e.g. 'gs nschool=100 nstud=10000'"""
+    return ' '.join([kind] + ['%s=%s' % (k,'x'.join(map(str,v)) if isinstance(v,tuple) else v) for k, v in sorted(params.items())])
+
+def random_game(actions,seed):
+    """random game in the format of Nash_eq_solver2.py with integer payoffs between 0 and 9"""
+    rng = np.random.RandomState(seed)
+    return rng.randint(0,10,size=tuple(actions[::-1]) + (len(actions),)).astype(float)
+
+def setup(kind,params,seed):
+    """builds the input of a case; returns a function without arguments that solves it"""
+    random.seed(seed)
+    np.random.seed(seed)
+    if kind in ('gen_sc','gen_sc_fast'):
+        import matching
+        return lambda: getattr(matching,kind)(params['nschool'],params['nstud'])
+    if kind in ('gs','ttc','boston'):
+        import matching
+        problem = matching.gen_sc(params['nschool'],params['nstud'])
+        def run():
+            scp = matching.schoolchoice(*problem)#building the preference and rank arrays is part of the work
+            return getattr(scp,kind)()
+        return run
+    if kind == 'gs_update':
+        import matching
+        import incremental
+        scp = matching.schoolchoice(*matching.gen_sc_fast(params['nschool'],params['nstud'],listlen=params['listlen'],seed=seed))
+        incremental.da_state(scp)#the first run is not part of the work
+        rng = random.Random(seed)
+        def run():#three changes, one update each
+            for k in range(3):
+                if params['change'] == 'capacity':
+                    school = rng.randrange(scp.nschool)
+                    delta = {'capacity':{school:scp.capacity[school] + 1}}
+                else:
+                    stud = rng.randrange(scp.nstud)
+                    pref = list(scp.preference[stud])
+                    rng.shuffle(pref)
+                    delta = {'preference':{stud:pref}}
+                incremental.update(scp,delta)
+        return run
+    payoffs = random_game(params['actions'],seed)
+    if kind == 'bimatrix':
+        from bimatrix import nash_bimatrix
+        return lambda: nash_bimatrix(payoffs)
+    if kind == 'correlated':
+        from correlated import correlatedlp
+        return lambda: correlatedlp(payoffs).welfare()
+    if kind == 'dominance':
+        from dominance import eliminate
+        return lambda: eliminate(payoffs)
+    if kind == 'iterative':
+        import iterative
+        return lambda: iterative.solve(payoffs,params['method'],16,1,maxiter=2000)
+    raise ValueError('unknown benchmark: %s' % kind)
+
+def maxrss():
+    """peak resident memory of this process in MB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/1024.**2 if sys.platform == 'darwin' else rss/1024.#bytes on mac, kB on linux
+
+def run_case(task):
+    """worker: runs one case repeat times; task is a tuple (kind, params, seed, repeat); returns a dictionary with the best and all times, the peak memory (of the whole process and the increase while solving) and the timers and counters of the last run"""
+    kind, params, seed, repeat = task
+    solve = setup(kind,params,seed)
+    before = maxrss()
+    times = []
+    for k in range(repeat):
+        with profiling.profiled() as report:
+            start = time.time()
+            solve()
+            times.append(time.time() - start)
+            profile = report()
+    return {'kind':kind,'params':dict((k,list(v) if isinstance(v,tuple) else v) for k, v in params.items()),
+            'seconds':min(times),'times':times,'peak_mb':maxrss(),'solve_mb':maxrss() - before,
+            'timers':profile['timers'],'counters':profile['counters']}
+
+def run_suite(filename='benchmark.json',cases=CASES,seed=0,repeat=3,verbose=True):
+    """runs all cases (list of (kind, params)), each in its own worker process, and writes the results to filename; returns the results (a dictionary with the environment and a dictionary of the cases by case_key)"""
+    out = {'python':platform.python_version(),'numpy':np.__version__,'machine':platform.machine(),
+           'seed':seed,'repeat':repeat,'date':time.strftime('%Y-%m-%d %H:%M:%S'),'cases':{}}
+    for kind, params in cases:
+        pool = multiprocessing.Pool(1,maxtasksperchild=1)
+        try:
+            result = pool.apply(run_case,((kind,params,seed,repeat),))
+        finally:
+            pool.terminate()
+        out['cases'][case_key(kind,params)] = result
+        if verbose:
+            print '%-45s %9.4f s %9.1f MB' % (case_key(kind,params),result['seconds'],result['peak_mb'])
+    with open(filename,'w') as f:
+        json.dump(out,f,indent=1,sort_keys=True)
+    return out
+
+def compare(current,baseline,tolerance=0.25,min_seconds=0.01):
+    """compares two results of run_suite (dictionaries or file names); returns a list of (case, measure, baseline value, current value) for every case that got slower or needs more memory by more than the fraction tolerance (times below min_seconds are not compared) or whose value of a counter in COUNTERS grew"""
+    if not isinstance(current,dict):
+        with open(current,'r') as f:
+            current = json.load(f)
+    if not isinstance(baseline,dict):
+        with open(baseline,'r') as f:
+            baseline = json.load(f)
+    out = []
+    for key in sorted(current['cases']):
+        if key not in baseline['cases']:
+            continue
+        new, old = current['cases'][key], baseline['cases'][key]
+        if max(new['seconds'],old['seconds']) >= min_seconds and new['seconds'] > old['seconds']*(1 + tolerance):
+            out.append((key,'seconds',old['seconds'],new['seconds']))
+        if new['peak_mb'] > old['peak_mb']*(1 + tolerance):
+            out.append((key,'peak_mb',old['peak_mb'],new['peak_mb']))
+        for name in COUNTERS:
+            if new['counters'].get(name,0) > old['counters'].get(name,0):
+                out.append((key,name,old['counters'].get(name,0),new['counters'].get(name,0)))
+    return out
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['baseline']:
+        run_suite('benchmark_baseline.json')
+    else:
+        current = run_suite('benchmark.json')
+        if os.path.exists('benchmark_baseline.json'):
+            regressions = compare(current,'benchmark_baseline.json')
+            for key, measure, old, new in regressions:
+                print 'regression: %s %s %.4g -> %.4g' % (key,measure,old,new)
+            if regressions == []:
+                print 'no regressions against benchmark_baseline.json'
+            sys.exit(1 if regressions else 0)
@@ -0,0 +1,162 @@
+""" Exact Nash equilibria of two player games (bimatrix games).
+The payoffs are given in the same format as in Nash_eq_solver2.py: payoffs[a2][a1] is the
+payoff tuple when player 1 plays a1 and player 2 plays a2.
+An equilibrium is returned as a list [x,y] of mixed strategies (numpy arrays). """
+
+import itertools
+import numpy as np
+from game import Game
+import profiling
+
+SUPPORT_LIMIT = 200000#support enumeration is used if a game has at most this many pairs of supports
+
+def bimatrix(payoffs):
+    """returns the payoff matrices A (of player 1) and B (of player 2) where rows are player 1's actions and columns player 2's actions"""
+    payoffs = np.asarray(payoffs,dtype=float)
+    return payoffs[:,:,0].T, payoffs[:,:,1].T
+
+def unique_equilibria(equilibria,tol=1e-6):
+    """removes equilibria from the list equilibria whose probabilities all differ by less than tol from an equilibrium earlier in the list"""
+    out = []
+    kept = np.zeros((0,0))
+    for eq in equilibria:
+        v = np.concatenate(eq)
+        if len(kept) == 0 or np.abs(kept - v).max(1).min() >= tol:
+            out.append(eq)
+            kept = np.vstack((kept.reshape(-1,len(v)),v))
+    return out
+
+def support_pairs(m,n):
+    """number of pairs of supports of equal size in an m x n game"""
+    total = 0
+    cm = 1
+    cn = 1
+    for k in range(1,min(m,n) + 1):
+        cm = cm*(m - k + 1)//k#m choose k
+        cn = cn*(n - k + 1)//k
+        total = total + cm*cn
+    return total
+
+def support_enumeration(A,B,tol=1e-9,block=20000):
+    """finds all equilibria of the bimatrix game (A,B) with supports of equal size (this are all equilibria if the game is nondegenerate); for each support size, the indifference conditions of all pairs of supports are solved at once as a stack of linear systems (in blocks of block pairs)"""
+    A = np.asarray(A,dtype=float)
+    B = np.asarray(B,dtype=float)
+    m, n = A.shape
+    equilibria = []
+    for k in range(1,min(m,n) + 1):
+        I = np.array(list(itertools.combinations(range(m),k)))
+        J = np.array(list(itertools.combinations(range(n),k)))
+        pair = np.arange(len(I)*len(J))
+        for first in range(0,len(pair),block):
+            p = pair[first:first + block]
+            Ip = I[p//len(J)]#supports of player 1
+            Jp = J[p % len(J)]#supports of player 2
+            x, u, okx = indifference(B[Ip[:,:,None],Jp[:,None,:]].transpose(0,2,1))#x makes player 2 indifferent on Jp
+            y, v, oky = indifference(A[Ip[:,:,None],Jp[:,None,:]])#y makes player 1 indifferent on Ip
+            ok = okx & oky
+            ok[ok] = (x[ok] >= -tol).all(1) & (y[ok] >= -tol).all(1)
+            rows = np.nonzero(ok)[0]
+            X = np.zeros((len(rows),m))
+            Y = np.zeros((len(rows),n))
+            X[np.arange(len(rows))[:,None],Ip[rows]] = x[rows]
+            Y[np.arange(len(rows))[:,None],Jp[rows]] = y[rows]
+            best = (Y.dot(A.T).max(1) <= v[rows] + tol) & (X.dot(B).max(1) <= u[rows] + tol)#no profitable deviation outside the supports
+            for r in np.nonzero(best)[0]:
+                equilibria.append([np.clip(X[r],0.,1.),np.clip(Y[r],0.,1.)])
+    return unique_equilibria(equilibria)
+
+def indifference(M,tol=1e-12):
+    """solves M[p] z = w*1, sum(z)=1 for every square matrix M[p] in the stack M; returns the solutions z, the values w and a boolean array that is False where the system is singular"""
+    P, k = M.shape[:2]
+    S = np.zeros((P,k + 1,k + 1))
+    S[:,:k,:k] = M
+    S[:,:k,k] = -1.
+    S[:,k,:k] = 1.
+    ok = np.abs(np.linalg.det(S)) > tol
+    sol = np.zeros((P,k + 1))
+    if ok.any():
+        rhs = np.zeros((ok.sum(),k + 1,1))
+        rhs[:,k,0] = 1.
+        sol[ok] = np.linalg.solve(S[ok],rhs)[:,:,0]
+    return sol[:,:k], sol[:,k], ok
+
+def pivot(T,basis,enter,lex,tol=1e-12):
+    """pivots the variable with label enter into the basis of tableau T; ties in the ratio test are broken lexicographically using the columns lex of the initial basis (this avoids cycling in degenerate games); returns the label of the leaving variable"""
+    col = T[:,enter]
+    rows = np.nonzero(col > tol)[0]
+    for c in [T.shape[1] - 1] + lex:#right hand side first, then the initial basis columns
+        ratio = T[rows,c]/col[rows]
+        rows = rows[ratio <= ratio.min() + tol]
+        if len(rows) == 1:
+            break
+    r = rows[0]
+    leave = basis[r]
+    T[r] = T[r]/T[r,enter]
+    factor = T[:,enter].copy()
+    factor[r] = 0.
+    T -= factor[:,None]*T[r]
+    basis[r] = enter
+    return leave
+
+def lemke_howson(A,B,label=0,maxiter=10000):
+    """Lemke-Howson algorithm started by dropping label (0..m-1 are player 1's actions, m..m+n-1 player 2's actions); returns an equilibrium [x,y] or None if the dropped label is not picked up again within maxiter pivots"""
+    A = np.asarray(A,dtype=float)
+    B = np.asarray(B,dtype=float)
+    m, n = A.shape
+    A = A - A.min() + 1.#positive payoffs do not change the equilibria
+    B = B - B.min() + 1.
+    #column l of both tableaux belongs to the variable with label l
+    TP = np.hstack((B.T,np.eye(n),np.ones((n,1))))#B'x + s = 1; x has labels 0..m-1, s labels m..m+n-1
+    TQ = np.hstack((np.eye(m),A,np.ones((m,1))))#r + Ay = 1; r has labels 0..m-1, y labels m..m+n-1
+    basisP = list(range(m,m + n))
+    basisQ = list(range(m))
+    enter = label
+    inP = label < m#x_label enters in P, y_label enters in Q
+    for it in range(maxiter):
+        if inP:
+            leave = pivot(TP,basisP,enter,list(range(m,m + n)))
+        else:
+            leave = pivot(TQ,basisQ,enter,list(range(m)))
+        if leave == label:
+            break
+        enter = leave
+        inP = not inP
+    else:
+        return None#the path did not end within maxiter pivots, the basis is no equilibrium
+    x = np.zeros(m)
+    y = np.zeros(n)
+    for row, l in enumerate(basisP):
+        if l < m:
+            x[l] = TP[row,-1]
+    for row, l in enumerate(basisQ):
+        if l >= m:
+            y[l - m] = TQ[row,-1]
+    return [x/x.sum(),y/y.sum()]
+
+def lemke_howson_all(A,B):
+    """runs the Lemke-Howson algorithm with every starting label and returns the distinct equilibria found (runs that stop after maxiter pivots are left out)"""
+    m, n = np.shape(A)
+    equilibria = [lemke_howson(A,B,label) for label in range(m + n)]
+    return unique_equilibria([eq for eq in equilibria if eq is not None])
+
+def nash_bimatrix(payoffs,method=None,pure=False):
+    """returns a list of Nash equilibria of the two player game payoffs (format as in Nash_eq_solver2.py or a Game); method 'support' (all equilibria of nondegenerate games) or 'lemke' (equilibria reached by Lemke-Howson from every label); by default support enumeration is used if the game has at most SUPPORT_LIMIT pairs of supports; actions that are not rationalizable are removed first (they are not played in any equilibrium); if pure=True and the game has pure equilibria, only these are returned"""
+    game = payoffs if isinstance(payoffs,Game) else Game(payoffs)
+    if pure and len(game.pure_nash()) > 0:
+        return [game.pure_profile(profile) for profile in game.pure_nash()]
+    alive = game.rationalizable()
+    A, B = bimatrix(game.restrict(alive).payoffs)
+    if method is None:
+        method = 'support' if support_pairs(*A.shape) <= SUPPORT_LIMIT else 'lemke'
+    with profiling.timer('nash_' + method):
+        if method == 'support':
+            equilibria = support_enumeration(A,B)
+        else:
+            equilibria = lemke_howson_all(A,B)
+    out = []
+    for x, y in equilibria:#back to the actions of the original game
+        eq = [np.zeros(game.no_a[0]),np.zeros(game.no_a[1])]
+        eq[0][alive[0]] = x
+        eq[1][alive[1]] = y
+        out.append(eq)
+    return out
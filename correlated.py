@@ -0,0 +1,79 @@
+""" Linear programs over the set of correlated equilibria of a finite game.
+The game is given in the same format as in correlated_eq_solver_.py (and Nash_eq_solver2.py):
+game[a_{n-1}]...[a_0] is the payoff tuple of the action profile (a_0,...,a_{n-1}).
+A correlated equilibrium is a probability distribution over action profiles; as a vector it is
+ordered as Ulist in correlated_eq_solver_.py, i.e. player 0's action changes fastest. """
+
+import numpy as np
+import scipy.sparse as sparse
+from scipy.optimize import linprog
+from game import Game
+import profiling
+
+def incentive_matrix(payoffs):
+    """sparse (CSR) matrix of the incentive constraints A f <= 0: one row for every player i, recommended action k and deviation p != k with entries u_i(p,a_-i) - u_i(k,a_-i) in the columns of the profiles (k,a_-i); the rows are built directly from the payoff array, no dense row is ever formed"""
+    payoffs = np.asarray(payoffs,dtype=float)
+    n = payoffs.ndim - 1
+    shape = payoffs.shape[:-1]
+    idx = np.arange(int(np.prod(shape))).reshape(shape)#column of every action profile
+    rows, cols, vals = [], [], []
+    start = 0
+    for i in range(n):
+        ax = n - 1 - i#the first axis belongs to the last player
+        m = shape[ax]
+        Ui = np.moveaxis(payoffs[...,i],ax,0).reshape(m,-1)#Ui[k] are i's payoffs of the profiles (k,a_-i)
+        Ci = np.moveaxis(idx,ax,0).reshape(m,-1)
+        k, p = np.nonzero(~np.eye(m,dtype=bool))#row (k,p) for every deviation p from recommendation k
+        vals.append((Ui[p] - Ui[k]).ravel())
+        cols.append(Ci[k].ravel())
+        rows.append(np.repeat(start + np.arange(len(k)),Ci.shape[1]))
+        start = start + len(k)
+    A = sparse.coo_matrix((np.concatenate(vals),(np.concatenate(rows),np.concatenate(cols))),shape=(start,idx.size)).tocsr()
+    A.eliminate_zeros()
+    return A
+
+class correlatedlp:
+    def __init__(self,game):
+        """builds the constraints of the correlated equilibria of game (format as above or a Game) once; they are shared by all objectives solved afterwards; actions that are not rationalizable are never played in a correlated equilibrium and are left out of the LP"""
+        self.game = game if isinstance(game,Game) else Game(game)
+        self.payoffs = self.game.payoffs
+        self.n = self.game.n#number of players
+        self.no_action = self.game.no_a#number of actions of each player
+        self.U = self.payoffs.reshape(-1,self.n)#U[:,i] are player i's payoffs of all action profiles
+        alive = self.game.rationalizable()
+        idx = np.arange(self.U.shape[0]).reshape(self.payoffs.shape[:-1])
+        self.cols = idx[np.ix_(*alive[::-1])].ravel()#action profiles in the LP (ordered as in the reduced game)
+        with profiling.timer('ce_constraint_build'):
+            self.A = incentive_matrix(self.game.restrict(alive).payoffs)
+        self.b = np.zeros(self.A.shape[0])
+        self.Aeq = sparse.csr_matrix(np.ones((1,len(self.cols))))#probabilities sum to 1
+        self.beq = np.ones(1)
+    #
+    def solve(self,c,maximize=False):
+        """returns a correlated equilibrium minimizing (maximizing if maximize=True) the linear objective c (one coefficient per action profile) and the value of the objective"""
+        c = np.asarray(c,dtype=float)
+        cr = c[self.cols]
+        profiling.count('ce_lp_solves')
+        with profiling.timer('ce_lp_solve'):
+            r = linprog(-cr if maximize else cr,A_ub=self.A,b_ub=self.b,A_eq=self.Aeq,b_eq=self.beq,bounds=(0.,None),method='interior-point',options={'sparse':True})
+        if not r.success:
+            raise ValueError('LP solver failed: %s' % r.message)
+        x = np.zeros(len(c))
+        x[self.cols] = np.clip(r.x,0.,1.)
+        return x, x.dot(c)
+    #
+    def welfare(self,maximize=True):
+        """correlated equilibrium maximizing (or minimizing) the sum of all players' payoffs"""
+        return self.solve(self.U.sum(1),maximize)
+    #
+    def player_payoff(self,i,maximize=True):
+        """correlated equilibrium maximizing (or minimizing) the expected payoff of player i"""
+        return self.solve(self.U[:,i],maximize)
+    #
+    def solve_all(self,objectives,maximize=True):
+        """solves the LP for every objective in the list objectives (each a vector with one coefficient per action profile) with the same constraints; returns a list of (equilibrium, value)"""
+        return [self.solve(c,maximize) for c in objectives]
+    #
+    def to_game_format(self,x,digits=3):
+        """rounds the distribution x and writes it in the nested list format of the game input"""
+        return np.round(x,digits).reshape(self.payoffs.shape[:-1]).tolist()
@@ -0,0 +1,101 @@
+""" Iterated elimination of never best responses (actions that are strictly dominated by a mixed strategy).
+The payoffs are given in the same format as in rationalizability.py: payoffs[a_{n-1}]...[a_0][i]
+is the payoff of player i in the action profile (a_0,...,a_{n-1}).
+The game is never copied: the remaining actions of each player are kept as a boolean mask over
+the original payoff tensors. """
+
+import numpy as np
+import scipy.sparse as sparse
+from scipy.optimize import linprog
+from payoffkernel import player_tensors
+import profiling
+
+def payoff_matrix(U,i,alive):
+    """player i's payoffs in the game restricted to the actions in alive (list of boolean masks) with one row per remaining action of i and one column per remaining profile of the opponents"""
+    sub = U[i][np.ix_(*alive)]
+    return np.moveaxis(sub,i,0).reshape(sub.shape[i],-1)
+
+def pure_filter(M,tol=1e-9):
+    """cheap checks before any LP: returns two boolean arrays (one entry per row of M), the first marks best responses to some pure profile of the opponents (these cannot be eliminated), the second actions that are strictly dominated by another pure action (these are eliminated)"""
+    best = (M >= M.max(0) - tol).any(1)
+    dominated = np.zeros(len(M),dtype=bool)
+    for k in range(len(M)):
+        dominated |= (M[k] > M + tol).all(1)
+    return best, dominated
+
+def dominance_lp(blocks,tol=1e-7):
+    """checks with one LP whether the candidate actions are strictly dominated by a mixed strategy: blocks is a list of (M, candidates) with a payoff matrix M as returned by payoff_matrix and the rows to check; for candidate j we look for a mixed strategy s and eps>=0 with s M >= M[j] + eps, maximizing eps; the problems of all candidates are independent and stacked block diagonally, the constraint block -M' is the same for all candidates of a player; returns a list of boolean arrays (True if dominated)"""
+    A, b, Aeq, c = [], [], [], []
+    with profiling.timer('dominance_constraint_build'):
+        for M, candidates in blocks:
+            m, R = M.shape
+            block = sparse.hstack((sparse.csr_matrix(-M.T),np.ones((R,1))))#M[j] - s M + eps <= 0
+            eye = sparse.identity(len(candidates))
+            A.append(sparse.kron(eye,block))
+            Aeq.append(sparse.kron(eye,sparse.csr_matrix(np.append(np.ones(m),0.))))#s sums to 1
+            b.append(-M[candidates].ravel())
+            c.append(np.tile(np.append(np.zeros(m),-1.),len(candidates)))#maximize the sum of all eps
+        A = sparse.block_diag(A,format='csr')
+        Aeq = sparse.block_diag(Aeq,format='csr')
+    profiling.count('dominance_lp_solves')
+    with profiling.timer('dominance_lp_solve'):
+        r = linprog(np.concatenate(c),A_ub=A,b_ub=np.concatenate(b),A_eq=Aeq,b_eq=np.ones(sum(len(cand) for M, cand in blocks)),bounds=(0.,None),method='interior-point',options={'sparse':True})
+    if not r.success:
+        raise ValueError('LP solver failed: %s' % r.message)
+    out = []
+    start = 0
+    for M, candidates in blocks:
+        m = M.shape[0]
+        eps = r.x[start:start + len(candidates)*(m + 1)].reshape(-1,m + 1)[:,m]
+        out.append(eps > tol*max(1.,np.abs(M).max()))
+        start = start + len(candidates)*(m + 1)
+    return out
+
+def eliminate(payoffs,tol=1e-7,ordered=False):
+    """iterated elimination of never best responses; returns a list with a boolean mask of the remaining actions of every player and a dictionary with the number of rounds, LPs and LP checks (candidate actions that needed an LP); a player is checked again only if the action set of an opponent shrank since his last check; ordered=True if payoffs is already an array U as returned by player_tensors"""
+    U = np.asarray(payoffs,dtype=float) if ordered else player_tensors(payoffs)
+    n = U.shape[0]
+    alive = [np.ones(a,dtype=bool) for a in U.shape[1:]]
+    dirty = [True]*n#players whose opponents lost actions since the last check
+    stats = {'rounds':0,'lps':0,'lp_checks':0}
+    while any(dirty):
+        stats['rounds'] = stats['rounds'] + 1
+        remove = [[] for i in range(n)]
+        blocks = []
+        for i in range(n):
+            if not dirty[i]:
+                continue
+            dirty[i] = False
+            actions = np.nonzero(alive[i])[0]
+            if len(actions) == 1:#a single action cannot be dominated
+                continue
+            M = payoff_matrix(U,i,alive)
+            best, dominated = pure_filter(M,tol)
+            remove[i].extend(actions[dominated & ~best])
+            candidates = np.nonzero(~best & ~dominated)[0]
+            if len(candidates) > 0 and M.shape[1] > 1:#with a single opponent profile, pure best responses are all that survive
+                blocks.append((i,actions,M,candidates))
+            elif len(candidates) > 0:
+                remove[i].extend(actions[candidates])
+        if blocks != []:
+            stats['lps'] = stats['lps'] + 1
+            stats['lp_checks'] = stats['lp_checks'] + sum(len(block[3]) for block in blocks)
+            for (i,actions,M,candidates), dominated in zip(blocks,dominance_lp([(M,cand) for i, actions, M, cand in blocks],tol)):
+                remove[i].extend(actions[candidates[dominated]])
+        for i in range(n):
+            if remove[i] != []:
+                alive[i][remove[i]] = False
+                for j in range(n):
+                    if j != i:
+                        dirty[j] = True
+    return alive, stats
+
+def rationalizable(payoffs,tol=1e-7):
+    """list with the rationalizable actions of every player"""
+    alive, stats = eliminate(payoffs,tol)
+    return [np.nonzero(mask)[0].tolist() for mask in alive]
+
+def reduced_game(payoffs,alive):
+    """the game table (format as payoffs) restricted to the actions in alive"""
+    payoffs = np.asarray(payoffs)
+    return payoffs[np.ix_(*(alive[::-1] + [np.ones(payoffs.shape[-1],dtype=bool)]))]
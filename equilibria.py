@@ -0,0 +1,142 @@
+""" Equilibria of many games: library functions and a batch service.
+Games are payoff arrays in the format of Nash_eq_solver2.py. A stream of games is read from an .npz
+file (one array per game, solved in the order of the names) and the results are written as one
+line of JSON per game, so an interrupted run can be resumed. """
+
+import os
+import json
+import itertools
+import multiprocessing
+import numpy as np
+from game import Game
+from bimatrix import nash_bimatrix
+from correlated import correlatedlp
+import iterative
+
+class eqindex:
+    def __init__(self,tol=1e-6):
+        """collects equilibria (lists of mixed strategies or distributions); two equilibria whose probabilities all differ by less than tol are the same"""
+        self.tol = tol
+        self.equilibria = []
+        self.counts = []#how often each equilibrium was added
+        self.points = np.zeros((0,0))
+    #
+    def add(self,eq,tol=None):
+        """adds eq and returns its number in the index (the number of an equilibrium already in the index if there is one within tol; default: the tol of the index)"""
+        tol = self.tol if tol is None else tol
+        v = np.concatenate([np.ravel(s) for s in eq]) if isinstance(eq,(list,tuple)) else np.ravel(eq)
+        if len(self.points) > 0:
+            dist = np.abs(self.points - v).max(1)
+            k = int(dist.argmin())
+            if dist[k] < tol:
+                self.counts[k] = self.counts[k] + 1
+                return k
+        self.points = np.vstack((self.points.reshape(-1,len(v)),v))
+        self.equilibria.append(eq)
+        self.counts.append(1)
+        return len(self.equilibria) - 1
+
+def nash_equilibria(payoffs,tol=1e-6,method='fp',restarts=16,eps=1e-3,maxiter=10000):
+    """Nash equilibria of the game payoffs (array or Game): all equilibria of two player games (see bimatrix.py); for games with more players, the pure equilibria and the approximate equilibria found by the iterative method from restarts random starting points (see iterative.py); an approximate (eps-Nash) equilibrium only approximates the probabilities of an equilibrium, so it is the same as an equilibrium already found if its probabilities differ by less than max(tol,10*eps); returns an eqindex"""
+    game = payoffs if isinstance(payoffs,Game) else Game(payoffs)
+    index = eqindex(tol)
+    if game.n == 2:
+        for eq in nash_bimatrix(game):
+            index.add(eq)
+        return index
+    for profile in game.pure_nash():
+        index.add(game.pure_profile(profile))
+    approx = max(tol,10*eps)
+    found, runs = iterative.solve(game,method,restarts,1,eps,maxiter,tol=approx)
+    for eq in found:
+        index.add(eq,approx)
+    return index
+
+def correlated_equilibria(payoffs,tol=1e-6):
+    """correlated equilibria of the game payoffs (array or Game) maximizing and minimizing the sum of payoffs and the payoff of each player (see correlated.py); returns an eqindex of the distributions (in the nested format of the game)"""
+    lp = correlatedlp(payoffs)
+    index = eqindex(tol)
+    objectives = [lp.U.sum(1)] + [lp.U[:,i] for i in range(lp.n)]
+    for maximize in [True,False]:
+        for x, value in lp.solve_all(objectives,maximize):
+            index.add(lp.to_game_format(x,12))
+    return index
+
+def read_games(filename):
+    """generator over the games in the .npz file filename: yields (name, payoffs) for every array in the file (sorted by name); an array called 'payoffs' with one more dimension than a game is read as a stack of games named payoffs_0, payoffs_1,..."""
+    with np.load(filename) as data:
+        for name in sorted(data.files):
+            payoffs = data[name]#arrays are only read when they are needed
+            if name == 'payoffs' and payoffs.ndim == payoffs.shape[-1] + 2:
+                for k in range(len(payoffs)):
+                    yield '%s_%d' % (name,k), payoffs[k]
+            else:
+                yield name, payoffs
+
+def write_games(filename,games):
+    """saves the list games (payoff arrays) in the .npz file filename as game_000000, game_000001,..."""
+    np.savez(filename,**dict(('game_%06d' % k,np.asarray(payoffs)) for k, payoffs in enumerate(games)))
+
+settings = {}#options of the worker processes, set once per worker by init_worker
+
+def init_worker(kind,options):
+    """runs once in every worker process: stores kind ('nash' or 'correlated') and the solver options"""
+    settings['kind'] = kind
+    settings['options'] = options
+
+def solve_task(task):
+    """worker: solves one game; task is a tuple (name, payoffs); returns the line of output (a dictionary)"""
+    name, payoffs = task
+    solver = nash_equilibria if settings['kind'] == 'nash' else correlated_equilibria
+    try:
+        index = solver(payoffs,**settings['options'])
+    except ValueError as error:
+        return {'game':name,'kind':settings['kind'],'error':str(error)}
+    equilibria = [[np.asarray(s).tolist() for s in eq] if settings['kind'] == 'nash' else eq for eq in index.equilibria]
+    return {'game':name,'kind':settings['kind'],'equilibria':equilibria,'counts':index.counts}
+
+def done_games(outfile):
+    """names of the games already solved in outfile"""
+    done = set()
+    if os.path.exists(outfile):
+        with open(outfile,'r') as f:
+            for line in f:
+                if line.strip():
+                    done.add(json.loads(line)['game'])
+    return done
+
+def solve_games(infile,outfile,kind='nash',processes=None,chunksize=1000,**options):
+    """solves all games in the .npz file infile (see read_games) with a pool of processes workers (default: one per cpu; 1: no pool) and appends one JSON line per game to outfile as soon as it is solved; games already in outfile are skipped, so an interrupted run can be resumed; at most chunksize games are read ahead of the workers; options are passed to nash_equilibria or correlated_equilibria; returns the number of games solved"""
+    done = done_games(outfile)
+    tasks = ((name,payoffs) for name, payoffs in read_games(infile) if name not in done)
+    pool = None
+    if processes != 1:
+        pool = multiprocessing.Pool(processes,init_worker,(kind,options))#solvers are imported once per worker
+    else:
+        init_worker(kind,options)
+    count = 0
+    try:
+        with open(outfile,'a') as f:
+            while True:
+                chunk = list(itertools.islice(tasks,chunksize))
+                if chunk == []:
+                    break
+                results = pool.imap_unordered(solve_task,chunk) if pool is not None else (solve_task(task) for task in chunk)
+                for result in results:
+                    f.write(json.dumps(result) + '\n')
+                    f.flush()
+                    count = count + 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return count
+
+def load_results(outfile):
+    """reads outfile and returns a dictionary mapping the name of every game to its result"""
+    out = {}
+    with open(outfile,'r') as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                out[result['game']] = result
+    return out
@@ -0,0 +1,67 @@
+""" A finite game in strategic form together with the pure strategy information the solvers use.
+The payoffs are given in the same format as in Nash_eq_solver2.py: payoffs[a_{n-1}]...[a_0][i]
+is the payoff of player i in the action profile (a_0,...,a_{n-1}).
+Everything is computed once when it is first needed and then kept in the object, so several
+solvers can work with the same Game without parsing the payoffs again. """
+
+import numpy as np
+from payoffkernel import player_tensors, payoffkernel
+from dominance import eliminate, reduced_game
+
+class Game:
+    def __init__(self,payoffs):
+        """payoffs is a nested list or array in the format of Nash_eq_solver2.py"""
+        self.payoffs = np.asarray(payoffs,dtype=float)
+        self.U = player_tensors(self.payoffs)#U[i][a_0,...,a_{n-1}] is the payoff of player i
+        self.n = self.U.shape[0]#number of players
+        self.no_a = list(self.U.shape[1:])#number of actions of each player
+        self.cache = {}
+    #
+    def kernel(self):
+        """payoffkernel of the game (expected payoffs against mixed strategies)"""
+        if 'kernel' not in self.cache:
+            self.cache['kernel'] = payoffkernel(self.U,True)
+        return self.cache['kernel']
+    #
+    def best_responses(self):
+        """list with a boolean array for every player i (one entry per action profile, player 0's action on the first axis): True if a_i is a best response to a_-i"""
+        if 'br' not in self.cache:
+            self.cache['br'] = [self.U[i] == self.U[i].max(i,keepdims=True) for i in range(self.n)]
+        return self.cache['br']
+    #
+    def pure_nash(self):
+        """array with one row (a_0,...,a_{n-1}) for every pure Nash equilibrium"""
+        if 'pure_nash' not in self.cache:
+            self.cache['pure_nash'] = np.argwhere(np.logical_and.reduce(self.best_responses()))
+        return self.cache['pure_nash']
+    #
+    def dominated(self,weak=False):
+        """list with a boolean array for every player: True if the action is strictly (weakly if weak=True) dominated by another pure action"""
+        key = 'weak' if weak else 'strict'
+        if key not in self.cache:
+            out = []
+            for i in range(self.n):
+                M = np.moveaxis(self.U[i],i,0).reshape(self.no_a[i],-1)#one row per action of i
+                dom = np.zeros(self.no_a[i],dtype=bool)
+                for k in range(self.no_a[i]):
+                    if weak:
+                        dom |= (M[k] >= M).all(1) & (M[k] > M).any(1)
+                    else:
+                        dom |= (M[k] > M).all(1)
+                out.append(dom)
+            self.cache[key] = out
+        return self.cache[key]
+    #
+    def rationalizable(self):
+        """list with a boolean mask of the rationalizable actions of every player (iterated elimination of actions dominated by mixed strategies, see dominance.py)"""
+        if 'rationalizable' not in self.cache:
+            self.cache['rationalizable'] = eliminate(self.U,ordered=True)[0]
+        return self.cache['rationalizable']
+    #
+    def restrict(self,alive):
+        """the game in which every player i only has the actions in the boolean mask alive[i]"""
+        return Game(reduced_game(self.payoffs,alive))
+    #
+    def pure_profile(self,profile):
+        """the action profile (a_0,...,a_{n-1}) as a list of mixed strategies"""
+        return [np.eye(self.no_a[i])[profile[i]] for i in range(self.n)]
@@ -0,0 +1,321 @@
+""" Incremental deferred acceptance: updating the Gale Shapley match of a school choice problem after
+a few students or schools changed (appeals, late applications, added seats).
+The state of the student proposing deferred acceptance algorithm (tentatively accepted students, the
+position every student proposes to next and the time of every proposal and rejection) is kept with
+the problem. After a change, the rejections that may no longer hold are undone and only the students
+concerned propose again; the result is the match of a full run of deferred_acceptance on the changed
+problem. """
+
+import heapq
+import numpy as np
+from collections import deque
+from matching import schoolchoice
+import profiling
+
+INELIGIBLE = 2**31 - 1#rank of pairs where the student is not eligible (does not change when students are added)
+NEVER = float('inf')#rejection time of tentatively accepted students
+DELTA_KEYS = ('add','remove','preference','priority','capacity')
+
+def propose(state,free):
+    """deferred acceptance on the state (see da_state): follows the rejection chains started by the students in the deque free who propose from their position nextpos on; every proposal and every rejection gets the next time of the clock"""
+    preference, rank, length = state['preference'], state['rank'], state['length']
+    capacity, held, nextpos = state['capacity'], state['held'], state['nextpos']
+    ptime, rtime = state['ptime'], state['rtime']
+    t = state['clock']
+    while free:
+        stud = free.popleft()
+        while stud is not None and nextpos[stud] < length[stud]:#follows the rejection chain started by stud's proposal
+            pos = nextpos[stud]
+            school = preference[stud][pos]
+            r = rank[stud][pos]
+            nextpos[stud] = pos + 1
+            t = t + 1
+            ptime[stud].append(t)
+            rtime[stud].append(t)#rejected unless accepted below
+            if r >= INELIGIBLE:#stud is not eligible at school
+                continue
+            heap = held[school]
+            if len(heap) < capacity[school]:#free seat: stud is accepted and the chain ends
+                heapq.heappush(heap,(-r,stud))
+                rtime[stud][pos] = NEVER
+                stud = None
+            elif heap != [] and -heap[0][0] > r:#stud has higher priority than the worst accepted student who is rejected instead
+                rtime[stud][pos] = NEVER
+                stud = heapq.heapreplace(heap,(-r,stud))[1]
+                rtime[stud][nextpos[stud] - 1] = t
+    state['clock'] = t
+
+def da_state(sc):
+    """runs the deferred acceptance algorithm on the school choice problem sc and returns its state as a dictionary (preference and rank lists, tentatively accepted students held, proposal positions nextpos, proposal and rejection times ptime and rtime, capacity and for every school the dictionary listers of the students listing it with their position); the state is saved as sc.gs_state and the match as sc.gs_match"""
+    pref_arr, pref_len, prank_arr = sc.arrays()
+    length = pref_len.tolist()
+    listed = np.arange(pref_arr.shape[1]) < pref_len[:,None]
+    state = {'preference':[row[:l] for row, l in zip(pref_arr.tolist(),length)],
+             'rank':[row[:l] for row, l in zip(np.where(prank_arr < sc.nstud,prank_arr,INELIGIBLE).tolist(),length)],
+             'length':length,
+             'capacity':np.asarray(sc.capacity).tolist(),
+             'held':[[] for k in range(sc.nschool)],
+             'nextpos':[0]*sc.nstud,
+             'ptime':[[] for j in range(sc.nstud)],
+             'rtime':[[] for j in range(sc.nstud)],
+             'clock':0,
+             'history':True,#False once seats were added without a deferred acceptance history (see add_seats)
+             'released':{},#students removed from the heaps of these schools by reset (see release)
+             'position':{}}#priority positions of the schools whose priority was looked up
+    studs, pos = np.nonzero(listed)
+    school = pref_arr[listed]
+    order = np.argsort(school,kind='mergesort')
+    bounds = np.searchsorted(school[order],np.arange(sc.nschool + 1)).tolist()
+    studs, pos = studs[order].tolist(), pos[order].tolist()
+    state['listers'] = [dict(zip(studs[bounds[k]:bounds[k + 1]],pos[bounds[k]:bounds[k + 1]])) for k in range(sc.nschool)]
+    with profiling.timer('gs'):
+        propose(state,deque(range(sc.nstud)))
+    sc.gs_state = state
+    sc.gs_match = held_match(state['held'])
+    return state
+
+def held_match(held):
+    """the match of the heaps of tentatively accepted students (students of a school ordered by priority as in deferred_acceptance)"""
+    return [[item[1] for item in sorted(heap,reverse=True)] for heap in held]
+
+def position(state,sc,k):
+    """dictionary of the priority positions of the students at school k (built on the first call)"""
+    if k not in state['position']:
+        prio = np.asarray(sc.priority[k]).tolist()
+        state['position'][k] = dict(zip(prio,range(len(prio))))
+    return state['position'][k]
+
+def reset(state,stud,pos,examine,pending):
+    """undoes all proposals of stud from position pos of his list on: he is removed from the school that tentatively accepts him (when the heaps are rebuilt, see release) and the schools he proposed to (and was eligible at) are examined again; if he is about to propose again, his old proposal to this school may have been counted in its examination and it is examined again as well"""
+    nextpos = state['nextpos'][stud]
+    if nextpos > pos and state['rtime'][stud][nextpos - 1] == NEVER:
+        state['released'].setdefault(state['preference'][stud][nextpos - 1],set()).add(stud)
+    last = min(nextpos + 1,state['length'][stud]) if stud in pending else nextpos
+    for p in range(pos,last):
+        if state['rank'][stud][p] < INELIGIBLE:
+            examine.add(state['preference'][stud][p])
+    state['nextpos'][stud] = min(pos,nextpos)
+    del state['ptime'][stud][pos:]
+    del state['rtime'][stud][pos:]
+
+def release(state):
+    """removes the students released by reset from the heaps of tentatively accepted students (one rebuild per school)"""
+    for k, studs in state['released'].items():
+        heap = [item for item in state['held'][k] if item[1] not in studs]
+        heapq.heapify(heap)
+        state['held'][k] = heap
+    state['released'] = {}
+
+def examine_school(state,k,examine,pending,limit=None):
+    """checks the rejections of school k in the order of time: a rejection holds if at the time of the rejection at least capacity students with higher priority had proposed to k (proposals that were undone do not count); students whose rejection does not hold propose to k again; the check stops as soon as more than limit students are pending; returns the number of reset students"""
+    capacity = state['capacity'][k]
+    nextpos, rank, ptime, rtime = state['nextpos'], state['rank'], state['ptime'], state['rtime']
+    events = []
+    for stud, pos in state['listers'][k].iteritems():
+        if pos < nextpos[stud] and rank[stud][pos] < INELIGIBLE:
+            events.append((ptime[stud][pos],0,rank[stud][pos],stud,pos))#proposal
+            if rtime[stud][pos] != NEVER:
+                events.append((rtime[stud][pos],1,rank[stud][pos],stud,pos))#rejection (after the proposals of the same time)
+    events.sort()
+    best = []#heap of the (negative) ranks of the capacity best proposers so far
+    resets = 0
+    for t, rejection, r, stud, pos in events:
+        if not rejection:
+            heapq.heappush(best,-r)
+            if len(best) > capacity:
+                heapq.heappop(best)
+        elif capacity > 0 and (len(best) < capacity or -best[0] >= r):#fewer than capacity proposers with higher priority (the student himself may be among the best)
+            reset(state,stud,pos + 1,examine,pending)
+            state['nextpos'][stud] = pos
+            del state['ptime'][stud][pos:]
+            del state['rtime'][stud][pos:]
+            pending.add(stud)
+            resets = resets + 1
+            if limit is not None and len(pending) > limit:
+                break
+    return resets
+
+def best_desirer(state,k):
+    """(rank, student, position of k in his list) of the student with the highest priority among the students desiring school k (they are eligible at k and were rejected by it, i.e. prefer it to their school) or None"""
+    nextpos, rank, rtime = state['nextpos'], state['rank'], state['rtime']
+    best = None
+    for stud, pos in state['listers'][k].iteritems():
+        if pos < nextpos[stud] and rank[stud][pos] < INELIGIBLE and rtime[stud][pos] != NEVER and (best is None or rank[stud][pos] < best[0]):
+            best = (rank[stud][pos],stud,pos)
+    return best
+
+def holder(state,stud):
+    """the school that holds stud (None if he is unmatched)"""
+    pos = state['nextpos'][stud] - 1
+    return state['preference'][stud][pos] if pos >= 0 and state['rtime'][stud][pos] == NEVER else None
+
+def admit(state,r,stud,pos):
+    """school k at position pos of stud's list admits stud (r is his rank at k): he leaves the school that holds him and no longer desires the schools between the two; returns the old school (None if he was unmatched) and the schools he no longer desires"""
+    old = holder(state,stud)
+    last = state['nextpos'][stud] - 1 if old is not None else state['length'][stud]
+    if old is not None:
+        heap = state['held'][old]
+        heap.remove((-state['rank'][stud][last],stud))
+        heapq.heapify(heap)
+    state['clock'] = state['clock'] + 1
+    del state['ptime'][stud][pos + 1:]
+    del state['rtime'][stud][pos + 1:]
+    state['ptime'][stud][pos] = state['clock']
+    state['rtime'][stud][pos] = NEVER
+    state['nextpos'][stud] = pos + 1
+    heapq.heappush(state['held'][state['preference'][stud][pos]],(-r,stud))
+    return old, [state['preference'][stud][p] for p in range(pos,last) if state['rank'][stud][p] < INELIGIBLE]
+
+def add_seats(state,schools):
+    """the schools in the list schools got more seats (state['capacity'] is already raised): the match before was the student optimal stable match, so the new one is found by improving it; a free seat is taken by the student with the highest priority among those desiring the school, which frees his old seat (a vacancy chain); the match is then stable and is improved by cycles in which every school admits its best desiring student from the next school of the cycle (see efficiency_adjusted_da in matching.py) until there is none; only the schools whose best desiring student changed are searched for cycles; the moves are not a run of deferred acceptance, i.e. the state has no history for later examinations afterwards; returns the number of moved students"""
+    held, capacity = state['held'], state['capacity']
+    moved = 0
+    changed = set(schools)#schools whose best desiring student may have changed
+    vacant = list(schools)
+    while vacant:#vacancy chains
+        k = vacant.pop()
+        while len(held[k]) < capacity[k]:
+            best = best_desirer(state,k)
+            if best is None:
+                break
+            old, lost = admit(state,*best)
+            moved = moved + 1
+            changed.update(lost)
+            if old is not None:
+                vacant.append(old)
+                changed.add(old)
+    dead = set()#schools that cannot be on a cycle
+    while changed:#improvement cycles
+        path = [changed.pop()]
+        onpath = {path[0]:0}
+        while path:
+            k = path[-1]
+            best = best_desirer(state,k) if k not in dead else None
+            nxt = holder(state,best[1]) if best is not None else None
+            if nxt is None or nxt in dead:#nobody desires k or the best desiring student cannot move
+                dead.add(k)
+                del onpath[k]
+                path.pop()
+            elif nxt not in onpath:
+                onpath[nxt] = len(path)
+                path.append(nxt)
+            else:#every school of the cycle admits its best desiring student
+                cycle = path[onpath[nxt]:]
+                del path[onpath[nxt]:]
+                moves = [best_desirer(state,k) for k in cycle]
+                for k in cycle:
+                    del onpath[k]
+                for best in moves:
+                    changed.update(admit(state,*best)[1])
+                    moved = moved + 1
+                changed.update(cycle)
+                changed.difference_update(dead)
+    state['history'] = False
+    return moved
+
+def change_preference(state,sc,stud,pref,examine,pending):
+    """replaces the preference list of stud by pref: his proposals are undone and he proposes from the start of his new list"""
+    reset(state,stud,0,examine,pending)
+    for k in state['preference'][stud]:
+        state['listers'][k].pop(stud,None)
+    pref = np.asarray(pref,dtype=np.int64).tolist()
+    state['preference'][stud] = pref
+    state['rank'][stud] = [position(state,sc,k).get(stud,INELIGIBLE) for k in pref]
+    state['length'][stud] = len(pref)
+    for p, k in enumerate(pref):
+        state['listers'][k][stud] = p
+    sc.preference[stud] = pref
+    if pref != []:
+        pending.add(stud)
+    else:
+        pending.discard(stud)
+
+def reject(state,stud,pending):
+    """rejects stud by the school that tentatively accepted him (he was already removed from its heap)"""
+    state['clock'] = state['clock'] + 1
+    state['rtime'][stud][-1] = state['clock']
+    pending.add(stud)
+
+def change_priority(state,sc,k,prio,pending):
+    """replaces the priority list of school k by prio and updates the ranks of all students listing k; tentatively accepted students that are no longer eligible are rejected"""
+    sc.priority[k] = prio
+    state['position'].pop(k,None)
+    pos = position(state,sc,k)
+    listers = state['listers'][k]
+    for stud, p in listers.iteritems():
+        state['rank'][stud][p] = pos.get(stud,INELIGIBLE)
+    heap = []
+    for item in state['held'][k]:
+        r = state['rank'][item[1]][listers[item[1]]]
+        if r < INELIGIBLE:
+            heap.append((-r,item[1]))
+        else:
+            reject(state,item[1],pending)
+    heapq.heapify(heap)
+    state['held'][k] = heap
+
+def update(sc,delta,verify=False,max_share=0.1):
+    """updates the Gale Shapley match of the school choice problem sc after the changes in delta, a dictionary with (all optional) entries 'add' (list of preference lists of new students, numbered from sc.nstud on), 'remove' (list of students; they keep their number and get an empty preference list), 'preference' (dictionary student: new preference list), 'priority' (dictionary school: new priority list, also needed to give new students a priority) and 'capacity' (dictionary school: new capacity); sc is changed accordingly; the state of the previous run (see da_state) is used if sc has one; if only seats are added, the match is improved by vacancy chains and cycles (see add_seats) without examinations; otherwise, if the changes spread and more than the fraction max_share of the students have to propose again or the examinations look at more than the fraction max_share of the listed pairs, an update does not pay: it stops at once and deferred acceptance is run on the whole changed problem (counted as gs_update_full; also after seats were added as there is no history to examine); verify=True compares the result with a full run and raises a ValueError if they differ; returns the match and a dictionary with the number of school examinations, reset rejections (students moved when seats are added), students that proposed again and whether a full run was needed"""
+    for key in delta:
+        if key not in DELTA_KEYS:
+            raise ValueError('unknown change: %s' % key)
+    if getattr(sc,'gs_state',None) is None:
+        da_state(sc)
+    state = sc.gs_state
+    sc.priority = list(sc.priority)
+    sc.preference = list(sc.preference)
+    sc.capacity = np.asarray(sc.capacity).tolist()
+    examine = set()#schools whose rejections have to be checked
+    pending = set()#students who propose (again)
+    stats = {'examined':0,'reset':0,'proposing':0,'full':False}
+    with profiling.timer('gs_update'):
+        if set(delta) == set(['capacity']) and all([capacity >= state['capacity'][k] for k, capacity in delta['capacity'].items()]):#only seats are added
+            for k, capacity in delta['capacity'].items():
+                state['capacity'][k] = capacity
+                sc.capacity[k] = capacity
+            stats['reset'] = add_seats(state,[k for k in delta['capacity']])
+            delta = {}
+        for k, capacity in delta.get('capacity',{}).items():
+            if capacity > state['capacity'][k]:
+                examine.add(k)
+            state['capacity'][k] = capacity
+            sc.capacity[k] = capacity
+            heap = state['held'][k]
+            while len(heap) > capacity:#the students with the lowest priority lose their seat
+                reject(state,heapq.heappop(heap)[1],pending)
+        for k, prio in delta.get('priority',{}).items():
+            change_priority(state,sc,k,prio,pending)
+            examine.add(k)
+        edits = dict(delta.get('preference',{}))
+        for stud in delta.get('remove',[]):
+            edits[stud] = []
+        for pref in delta.get('add',[]):
+            edits[len(sc.preference)] = pref
+            for key, value in (('preference',[]),('rank',[]),('length',0),('nextpos',0),('ptime',[]),('rtime',[])):
+                state[key].append(value)
+            sc.preference.append([])
+        sc.nstud = len(sc.preference)
+        for stud, pref in sorted(edits.items()):
+            change_preference(state,sc,stud,pref,examine,pending)
+        limit = max_share*sc.nstud
+        budget = max_share*sum(state['length'])#lister entries the examinations may look at
+        while examine and state['history'] and len(pending) <= limit and budget >= 0:
+            k = examine.pop()
+            budget = budget - len(state['listers'][k])
+            stats['examined'] = stats['examined'] + 1
+            stats['reset'] = stats['reset'] + examine_school(state,k,examine,pending,limit)
+        stats['proposing'] = len(pending)
+        sc.pref_arr, sc.pref_len, sc.prank_arr = None, None, None#the arrays of the old problem
+        if examine or len(pending) > limit or (pending and not state['history']):#no history to examine or the changes spread over a large part of the problem
+            stats['full'] = True
+            state = da_state(sc)
+        else:
+            release(state)
+            propose(state,deque(sorted(pending)))
+    profiling.count('gs_update_resets',stats['reset'])
+    profiling.count('gs_update_full',int(stats['full']))
+    match = held_match(state['held'])
+    sc.gs_match = list(match)
+    if verify and schoolchoice(sc.priority,sc.capacity,sc.preference).gs() != match:
+        raise ValueError('incremental match differs from the match of a full run')
+    return match, stats
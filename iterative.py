@@ -0,0 +1,111 @@
+""" Approximate Nash equilibria of large n-player games with iterative methods:
+fictitious play, replicator dynamics and regret matching.
+The payoffs are given in the same format as in Nash_eq_solver2.py (or as a Game, see game.py).
+All restarts are run at once: strategies are arrays of shape (B,a_i) for B restarts and the expected
+payoffs of all restarts are computed together by the payoffkernel. """
+
+import multiprocessing
+import numpy as np
+from game import Game
+from payoffkernel import payoffkernel
+from bimatrix import unique_equilibria
+import profiling
+
+METHODS = ('fp','replicator','regret')
+
+def exploitability(kernel,strat):
+    """largest gain any player can get by deviating from strat (a profile is an eps-Nash equilibrium if this is at most eps) and the gains of all players (shape (...,n))"""
+    gains = np.stack([u.max(-1) - (u*s).sum(-1) for u, s in zip(kernel.action_payoffs(strat),strat)],-1)
+    return gains.max(-1), gains
+
+def random_profiles(no_a,B,rng):
+    """B mixed strategy profiles drawn uniformly from the strategy simplices"""
+    return [rng.dirichlet(np.ones(a),size=B) for a in no_a]
+
+def fp_update(kernel,state):
+    """fictitious play: every player plays a best response to the empirical distribution of the others' past play; returns the empirical distribution"""
+    avg = state['avg']
+    t = state['t']
+    for i, u in enumerate(kernel.action_payoffs(avg)):
+        br = np.eye(kernel.no_a[i])[u.argmax(-1)]
+        avg[i] += (br - avg[i])/(t + 2.)
+    return avg
+
+def replicator_update(kernel,state):
+    """discrete time replicator dynamics: the probability of an action grows with its payoff relative to the average payoff (payoffs are shifted to be positive); returns the current strategies"""
+    x = state['x']
+    for i, u in enumerate(kernel.action_payoffs(x)):
+        fit = x[i]*(u - state['shift'])
+        x[i][:] = fit/fit.sum(-1)[:,None]
+    return x
+
+def regret_update(kernel,state):
+    """regret matching: every player plays actions with probability proportional to their positive cumulative regret; returns the average strategies"""
+    x = state['x']
+    for i, u in enumerate(kernel.action_payoffs(x)):
+        state['regret'][i] += u - (u*x[i]).sum(-1)[:,None]
+        pos = np.maximum(state['regret'][i],0.)
+        total = pos.sum(-1)[:,None]
+        x[i][:] = np.where(total > 0,pos/np.where(total > 0,total,1.),1./kernel.no_a[i])
+        state['sum'][i] += x[i]
+    return [s/(state['t'] + 1.) for s in state['sum']]
+
+def iterate(kernel,strat,method='fp',eps=1e-3,maxiter=10000,check=10):
+    """runs method ('fp', 'replicator' or 'regret') from the starting profiles strat (arrays of shape (B,a_i)) until a profile is an eps-Nash equilibrium or maxiter iterations are done; the exploitability is checked every check iterations and restarts that converged are not iterated any further; returns a dictionary with the final profiles, their exploitability, the number of iterations and whether they converged"""
+    update = {'fp':fp_update,'replicator':replicator_update,'regret':regret_update}[method]
+    B = len(strat[0])
+    state = {'t':0,'shift':kernel.U.min() - 1.,
+             'x':[np.array(s,dtype=float) for s in strat],
+             'avg':[np.array(s,dtype=float) for s in strat],
+             'regret':[np.zeros((B,a)) for a in kernel.no_a],
+             'sum':[np.zeros((B,a)) for a in kernel.no_a]}
+    out = {'strategies':[np.array(s,dtype=float) for s in strat],'exploitability':np.zeros(B),
+           'iterations':np.zeros(B,dtype=np.int64),'converged':np.zeros(B,dtype=bool)}
+    active = np.arange(B)#restarts that are still iterated
+    for t in range(maxiter):
+        state['t'] = t
+        profile = update(kernel,state)
+        profiling.count('iterative_iterations',len(active))#iterations summed over the active restarts
+        if (t + 1) % check != 0 and t + 1 < maxiter:
+            continue
+        expl, gains = exploitability(kernel,profile)
+        done = (expl <= eps) | (t + 1 == maxiter)
+        for i in range(kernel.n):
+            out['strategies'][i][active[done]] = profile[i][done]
+        out['exploitability'][active[done]] = expl[done]
+        out['iterations'][active[done]] = t + 1
+        out['converged'][active[done]] = expl[done] <= eps
+        if done.all():
+            break
+        keep = ~done
+        active = active[keep]
+        for key in ('x','avg','regret','sum'):
+            state[key] = [s[keep] for s in state[key]]
+    return out
+
+def run_restarts(task):
+    """worker: runs restarts with starting profiles drawn with seed; task is a tuple (U, method, restarts, seed, eps, maxiter, check) where U are the payoff tensors as returned by player_tensors"""
+    U, method, restarts, seed, eps, maxiter, check = task
+    kernel = payoffkernel(U,True)
+    strat = random_profiles(kernel.no_a,restarts,np.random.RandomState(seed))
+    return iterate(kernel,strat,method,eps,maxiter,check)
+
+def solve(payoffs,method='fp',restarts=16,processes=1,eps=1e-3,maxiter=10000,check=10,seed=0,tol=1e-2):
+    """approximate Nash equilibria of the game payoffs (format as in Nash_eq_solver2.py or a Game) found by method from restarts random starting profiles; the restarts are split over processes worker processes (None: one per cpu); returns a list of the distinct eps-Nash equilibria (profiles closer than tol are counted once; each a list of mixed strategies) and the dictionary of all restarts (see iterate)"""
+    game = payoffs if isinstance(payoffs,Game) else Game(payoffs)
+    if processes == 1:
+        results = [run_restarts((game.U,method,restarts,seed,eps,maxiter,check))]
+    else:
+        processes = processes or multiprocessing.cpu_count()
+        sizes = [len(part) for part in np.array_split(np.arange(restarts),processes) if len(part) > 0]
+        tasks = [(game.U,method,sizes[k],seed + k,eps,maxiter,check) for k in range(len(sizes))]
+        pool = multiprocessing.Pool(len(tasks))
+        try:
+            results = pool.map(run_restarts,tasks)
+        finally:
+            pool.terminate()
+    out = {'strategies':[np.concatenate([r['strategies'][i] for r in results]) for i in range(game.n)]}
+    for key in ('exploitability','iterations','converged'):
+        out[key] = np.concatenate([r[key] for r in results])
+    found = [[s[b] for s in out['strategies']] for b in np.nonzero(out['converged'])[0]]
+    return unique_equilibria(found,tol), out
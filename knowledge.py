@@ -1,47 +1,139 @@
 
+from collections import OrderedDict
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
 class infostructure:
 
-    def __init__(self,partitions):
-        """read in partitions 
+    def __init__(self,partitions,cache_size=1024):
+        """read in partitions
         'partitions' is a list where each element is the info partition of one player
-        an info partition is a list of sets where each set is one element of the partition"""
+        an info partition is a list of sets where each set is one element of the partition
+        internally, states are numbered 0..nstates-1 and the partition of player i is stored as an array
+        cell[i] giving for each state the number of the partition element containing it"""
         self.parts = partitions
         self.n = len(self.parts)#number of players
+        self.states = sorted(set().union(*self.parts[0]))
+        self.index = dict((state,k) for k, state in enumerate(self.states))
+        self.nstates = len(self.states)
+        self.cell = []
+        for part in self.parts:
+            cell = np.empty(self.nstates,dtype=np.int64)
+            for c, element in enumerate(part):
+                cell[[self.index[state] for state in element]] = c
+            self.cell.append(cell)
+        self.ncell = [len(part) for part in self.parts]
+        self.meets = {}#meets of subsets of players
+        self.cache = OrderedDict()#results of knowledge operators, least recently used first
+        self.cache_size = cache_size
+        self.meet = self.meet_of(range(self.n))#common knowledge partition
+
+    def meet_of(self,players):
+        "returns the meet (finest common coarsening) of the partitions of players as an array of cell numbers; two states are in the same cell if they are connected through partition elements of these players (union-find over a graph in which states are linked to the partition elements containing them); meets are computed once for every set of players"
+        key = tuple(sorted(set(players)))
+        if key in self.meets:
+            return self.meets[key]
+        offset = self.nstates
+        rows, cols = [], []
+        for i in players:
+            rows.append(np.arange(self.nstates))
+            cols.append(offset + self.cell[i])
+            offset = offset + self.ncell[i]
+        rows = np.concatenate(rows) if rows != [] else np.zeros(0,dtype=np.int64)
+        cols = np.concatenate(cols) if cols != [] else np.zeros(0,dtype=np.int64)
+        graph = coo_matrix((np.ones(len(rows)),(rows,cols)),shape=(offset,offset))
+        ncomp, label = connected_components(graph,directed=False)
+        self.meets[key] = np.unique(label[:self.nstates],return_inverse=True)[1]
+        return self.meets[key]
+
+    def join_of(self,players):
+        "returns the join (coarsest common refinement) of the partitions of players as an array of cell numbers"
+        cells = np.column_stack([self.cell[i] for i in players] + [np.zeros(self.nstates,dtype=np.int64)])
+        return np.unique(cells,axis=0,return_inverse=True)[1]
+
+    def partition(self,players):
+        "cell array of player players (an int) or of the meet of the players in the list players"
+        if isinstance(players,(int,np.integer)):
+            return ('player',players), self.cell[players]
+        key = tuple(sorted(set(players)))
+        return ('meet',key), self.meet_of(key)
+
+    def mask(self,event):
+        "turns an event (set of states or boolean array with one entry per state) into a boolean array"
+        if isinstance(event,np.ndarray) and event.dtype == bool:
+            return event
+        out = np.zeros(self.nstates,dtype=bool)
+        out[[self.index[state] for state in event if state in self.index]] = True
+        return out
+
+    def to_set(self,mask):
+        "turns a boolean array into the set of states"
+        return set(self.states[k] for k in np.nonzero(mask)[0])
+
+    def masks(self,events):
+        "turns a list of events (sets or boolean arrays) or a 2-dimensional boolean array (one row per event) into a 2-dimensional boolean array"
+        if isinstance(events,np.ndarray) and events.dtype == bool and events.ndim == 2:
+            return events
+        return np.array([self.mask(event) for event in events],dtype=bool).reshape(-1,self.nstates)
+
+    def know_event(self,mask,players):
+        "applies the knowledge operator of player players (an int) or of common knowledge among the list players to the event mask (boolean array); the result is a boolean array; results of the last cache_size (event, partition) pairs are kept (least recently used are dropped first) with events and results stored as bitsets"
+        key, cell = self.partition(players)
+        ckey = (key,np.packbits(mask).tostring())
+        if ckey in self.cache:
+            self.cache[ckey] = self.cache.pop(ckey)#most recently used
+            return np.unpackbits(self.cache[ckey])[:self.nstates].astype(bool)
+        missing = np.bincount(cell[~mask],minlength=cell.max() + 1)#number of states of each cell not in the event
+        out = (missing == 0)[cell]
+        self.cache[ckey] = np.packbits(out)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return out
+
+    def know_many(self,events,players):
+        "knowledge operator (see know_event) for many events; returns a boolean array with one row per event"
+        E = self.masks(events)
+        return np.array([self.know_event(mask,players) for mask in E],dtype=bool).reshape(E.shape)
+
+    def common_know_in_w_many(self,events,states,players=None):
+        "checks for every pair (events[k], states[k]) whether the event is common knowledge (among players, default: all players) in the state; returns a boolean array"
+        players = list(range(self.n) if players is None else players)
+        E = self.masks(events)
+        out = np.zeros(len(E),dtype=bool)
+        for k in range(len(E)):
+            if states[k] in self.index:
+                out[k] = self.know_event(E[k],players)[self.index[states[k]]]
+        return out
+
+    def self_evident_many(self,events,players):
+        "checks for every event whether it is self evident among players in list 'players'; returns a boolean array"
+        E = self.masks(events)
+        out = np.ones(len(E),dtype=bool)
+        for k in range(len(E)):
+            for i in players:
+                if (self.know_event(E[k],i) != E[k]).any():
+                    out[k] = False
+                    break
+        return out
 
     def know(self,event,i):
         "returns the set of states in which player i knows event"
-        out = set()
-        info_i = self.parts[i]
-        for part in info_i:
-            if part.issubset(event):
-                out = out.union(part)
-        return out
+        return self.to_set(self.know_many([event],i)[0])
+
+    def common_know(self,event,players=None):
+        "returns the states in which event is common knowledge (among players, default: all players)"
+        players = range(self.n) if players is None else players
+        return self.to_set(self.know_many([event],list(players))[0])
 
-    def common_know(self,event):
-        "returns the states in which event is common knowledge"
-        candidate = event
-        old_candidate = set()
-        while old_candidate!=candidate and len(candidate)>0:
-            old_candidate = candidate
-            for i in range(self.n):
-                candidate = self.know(candidate,i)
-        return candidate
-
-    def common_know_in_w(self,event,w):
+    def common_know_in_w(self,event,w,players=None):
         "checks whether event is common knowledge in state w; returns True/False"
-        if w in self.common_know(event):
-            return True
-        else:
-            return False
+        return bool(self.common_know_in_w_many([event],[w],players)[0])
 
     def self_evident(self,event,players):
         "checks whether event is self evident among players in list 'players' "
-        for i in players:
-            for part in self.parts[i]:
-                if len(event.intersection(part))>0 and not part.issubset(event):
-                    return False
-        return True
-                        
+        return bool(self.self_evident_many([event],players)[0])
+
 
 partition1 = [{1,2},{3,4,5},{6}]
 partition2 = [{1},{2,3,4},{5},{6}]
@@ -51,4 +143,4 @@ ex1 = infostructure([partition1,partition2])
 
 F = {1,2,3,4,5}
 E = {1,2,3,4}
-return 'F is common knowledge in states ',list(ex1.common_know(F)), '.  E is common knowledge in states ', list(ex1.common_know(E)),'.'
+print 'F is common knowledge in states ',list(ex1.common_know(F)), '.  E is common knowledge in states ', list(ex1.common_know(E)),'.'
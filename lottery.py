@@ -0,0 +1,106 @@
+""" Assignment probabilities of school choice problems with weak (coarse) priorities.
+The priority of a school is a list of priority classes (highest first, e.g. siblings, walk zone,
+others), each a list of students that are tied. Ties are broken by lottery: with single tie-breaking
+('stb') every student draws one number that is used at all schools, with multiple tie-breaking
+('mtb') every school draws its own numbers. The priority classes of the listed pairs are computed
+once; a draw only adds a random number in [0,1) to the class of every pair. Draws are solved in
+batches (one stacked problem per batch) and the assignments are counted as they come in. """
+
+import multiprocessing
+import numpy as np
+from scipy.sparse import csr_matrix
+from matching import pref_array, pair_rank_array, deferred_acceptance, immediate_acceptance, flatten
+import profiling
+
+RULES = ('stb','mtb')
+MECHANISMS = {'gs':deferred_acceptance,'boston':immediate_acceptance}
+
+def pair_class_array(pref_arr,pref_len,priority,nstud):
+    """priority classes of the listed pairs: element [j,p] is the class (0 is the highest) of student j at the pth school of his list (pref_arr and pref_len as returned by pref_array); priority is a list with the list of classes of every school; returns the class matrix and the largest number of classes of a school nclass which is also the entry of pairs where j is not eligible or p >= pref_len[j]"""
+    sizes = [np.array([len(cls) for cls in classes],dtype=np.int64) for classes in priority]
+    nclass = max([len(s) for s in sizes] + [0])
+    strict = [np.concatenate([np.asarray(cls,dtype=np.int32) for cls in classes]) if len(classes) > 0 else np.zeros(0,dtype=np.int32) for classes in priority]#classes one after the other
+    rank = pair_rank_array(pref_arr,pref_len,strict,nstud)
+    cls_flat = np.concatenate([np.repeat(np.arange(len(s)),s) for s in sizes] + [np.zeros(0,dtype=np.int64)])#class of every position of the concatenated lists
+    off = np.concatenate(([0],np.cumsum([s.sum() for s in sizes],dtype=np.int64)))
+    eligible = rank < nstud
+    pclass = np.full(pref_arr.shape,nclass,dtype=np.int32)
+    pclass[eligible] = cls_flat[off[pref_arr[eligible]] + rank[eligible]]
+    return pclass, nclass
+
+def run_draws(task):
+    """worker: solves draws lottery draws drawn with seed; task is a tuple (lot, mechanism, rule, draws, batch, seed) with a lottery lot; returns the assignment counts (see lottery.count)"""
+    lot, mechanism, rule, draws, batch, seed = task
+    return lot.count(mechanism,rule,draws,batch,np.random.RandomState(seed))
+
+class lottery:
+    def __init__(self,priority,capacity,preference):
+        """read in data: priority is a list of lists where the kth lower level list contains the priority classes of school k (highest first), each a list of students with the same priority; capacity and preference as in schoolchoice; the preference matrix and the priority classes of the listed pairs are calculated once"""
+        self.priority = priority
+        self.capacity = np.asarray(capacity,dtype=np.int64)
+        self.preference = preference
+        self.nschool = len(capacity)
+        if self.nschool != len(priority):
+            raise ValueError('capacity and priority list must have same length')
+        self.nstud = len(preference)
+        with profiling.timer('lottery_classes'):
+            self.pref_arr, self.pref_len = pref_array(preference)
+            self.pclass_arr, self.nclass = pair_class_array(self.pref_arr,self.pref_len,priority,self.nstud)
+        self.listed = np.arange(self.pref_arr.shape[1]) < self.pref_len[:,None]
+    #
+    def draw(self,rule='stb',draws=1,rng=np.random):
+        """tie-broken priorities of draws lottery draws (shape (draws,nstud,list length), lower is better): the class of every listed pair plus a random number in [0,1) that is drawn once per student ('stb') or once per pair, i.e. for every school separately ('mtb'); pairs that are not eligible get nclass + 1"""
+        if rule == 'stb':
+            u = rng.random_sample((draws,self.nstud,1))
+        elif rule == 'mtb':
+            u = rng.random_sample((draws,) + self.pref_arr.shape)
+        else:
+            raise ValueError('unknown tie-breaking rule: %s' % rule)
+        return np.where(self.pclass_arr < self.nclass,self.pclass_arr + u,self.nclass + 1.)
+    #
+    def solve(self,mechanism,keys):
+        """solves the problem for all draws in keys (as returned by draw) with mechanism ('gs' or 'boston'); the draws are stacked into one problem in which draw d has the students d*nstud,...,(d+1)*nstud-1 and the schools d*nschool,...,(d+1)*nschool-1; returns the position of the assigned school in every student's preference list (shape (draws,nstud), -1 if unmatched)"""
+        if mechanism not in MECHANISMS:
+            raise ValueError('unknown mechanism: %s' % mechanism)
+        B = len(keys)
+        width = self.pref_arr.shape[1]
+        offset = (np.arange(B,dtype=np.int32)*self.nschool)[:,None,None]
+        pref_arr = np.where(self.listed,self.pref_arr + offset,-1).reshape(-1,width)
+        match = MECHANISMS[mechanism](pref_arr,np.tile(self.pref_len,B),keys.reshape(-1,width),np.tile(self.capacity,B),self.nclass)
+        studs, lengths = flatten(match)
+        pos = np.full(B*self.nstud,-1,dtype=np.int64)
+        schools = np.repeat(np.arange(B*self.nschool,dtype=np.int32),lengths)
+        pos[studs] = (pref_arr[studs] == schools[:,None]).argmax(1)
+        return pos.reshape(B,self.nstud)
+    #
+    def count(self,mechanism='gs',rule='stb',draws=1000,batch=100000,rng=np.random):
+        """solves draws lottery draws in batches of about batch students (at least one draw per batch); returns a matrix of the shape of the preference matrix which counts how often every student got the school at every position of his list"""
+        width = self.pref_arr.shape[1]
+        counts = np.zeros(self.nstud*width,dtype=np.int64)
+        size = max(1,batch//max(self.nstud,1))#draws per batch
+        for first in range(0,draws,size):
+            with profiling.timer('lottery_draw'):
+                keys = self.draw(rule,min(size,draws - first),rng)
+            with profiling.timer('lottery_solve'):
+                pos = self.solve(mechanism,keys)
+            matched = pos >= 0
+            counts += np.bincount((np.nonzero(matched)[1]*width + pos[matched]),minlength=len(counts))
+            profiling.count('lottery_draws',len(keys))
+        return counts.reshape(self.nstud,width)
+    #
+    def probabilities(self,mechanism='gs',rule='stb',draws=1000,processes=1,batch=100000,seed=0):
+        """assignment probabilities estimated from draws lottery draws with tie-breaking rule ('stb' or 'mtb') and mechanism ('gs' or 'boston'); the draws are split over processes worker processes (None: one per cpu) which solve them in batches of about batch students; worker k draws with seed seed + k; returns a sparse matrix (nstud x nschool) whose element [j,k] is the probability that student j is assigned to school k and the array of the probabilities that a student stays unmatched"""
+        if processes == 1:
+            counts = run_draws((self,mechanism,rule,draws,batch,seed))
+        else:
+            processes = processes or multiprocessing.cpu_count()
+            sizes = [len(part) for part in np.array_split(np.arange(draws),processes) if len(part) > 0]
+            tasks = [(self,mechanism,rule,sizes[k],batch,seed + k) for k in range(len(sizes))]
+            pool = multiprocessing.Pool(len(tasks))
+            try:
+                counts = sum(pool.map(run_draws,tasks))
+            finally:
+                pool.terminate()
+        rows = np.repeat(np.arange(self.nstud),self.pref_len)
+        prob = csr_matrix((counts[self.listed]/float(draws),(rows,self.pref_arr[self.listed])),shape=(self.nstud,self.nschool))
+        return prob, 1. - counts.sum(1)/float(draws)
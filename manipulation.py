@@ -0,0 +1,76 @@
+""" Manipulability of the Boston mechanism.
+For every student we look for the schools he could get by changing his report while all other
+students report truthfully: he keeps the first d schools of his true list (he was rejected by all of
+them in the truthful run) and reports school s next, for every round d up to k - 1 and at most the
+round in which he was admitted. The first d rounds are then exactly those of the truthful run, so he
+gets s if and only if his rank at s is below the admission cutoff of s in round d. The cutoffs of all
+rounds follow from one baseline run and the search over all students needs no rerun; it is done in
+chunks of students in a pool of worker processes. """
+
+import multiprocessing
+import numpy as np
+from scipy.sparse import csr_matrix
+from analysis import assignment
+import profiling
+
+def round_cutoffs(pref_arr,pref_len,prank_arr,capacity,pos):
+    """admission cutoffs of the Boston mechanism in every round from the positions pos of the assigned schools in the truthful run (as returned by analysis.assignment; arrays as returned by pref_array and pair_rank_array): a student who proposes to school k in round d (0 is the first round) and was not among its proposers in the truthful run is accepted if and only if his rank is below element [d,k] which is the number of students if k has more free seats than eligible proposers in round d, -1 if k is full before round d and otherwise the rank of the last accepted proposer"""
+    nstud = len(pref_len)
+    nschool = len(capacity)
+    width = pref_arr.shape[1]
+    depth = np.arange(width)
+    proposed = (depth <= pos[:,None]) & (depth < pref_len[:,None])#a student proposes in every round until he is accepted
+    studs, d = np.nonzero(proposed)
+    key = d*nschool + pref_arr[studs,d]
+    r = prank_arr[studs,d]
+    accepted = d == pos[studs]
+    eligible = np.bincount(key[r < nstud],minlength=width*nschool).reshape(width,nschool)
+    admitted = np.bincount(key[accepted],minlength=width*nschool).reshape(width,nschool)
+    seats = np.asarray(capacity,dtype=np.int64) - (np.cumsum(admitted,0) - admitted)#free seats at the start of every round
+    last = np.full(width*nschool,-1,dtype=np.int64)#rank of the last accepted proposer (-1 if nobody is accepted, e.g. the school is full)
+    np.maximum.at(last,key[accepted],r[accepted].astype(np.int64))
+    return np.where(eligible < seats,nstud,last.reshape(width,nschool))
+
+def obtainable(task):
+    """worker: positions of the obtainable schools of a chunk of students; task is a tuple (pref_arr, pref_len, prank_arr, pos, reach, k) with the rows of the chunk, the positions pos of their assigned schools and reach[d,k] the largest cutoff of school k in the rounds up to d; returns a boolean matrix of the shape of pref_arr which is True where a student can get the school at this position of his list by reporting it in one of the first k rounds (or by reporting truthfully)"""
+    pref_arr, pref_len, prank_arr, pos, reach, k = task
+    q = np.arange(pref_arr.shape[1])
+    listed = q < pref_len[:,None]
+    last = np.minimum(np.minimum(q - 1,pos[:,None]),k - 1)#last round in which the school at position q can be reported after the first schools of the true list
+    win = listed & (last >= 0) & (prank_arr < reach[np.maximum(last,0),np.maximum(pref_arr,0)])
+    return win | (listed & (q == pos[:,None]))
+
+def boston_manipulation(sc,k=1,processes=1,batch=100000):
+    """manipulation analysis of the Boston mechanism on the school choice problem sc (the baseline match is saved as sc.boston_match): a student can get school s if he keeps the first d schools of his true list, reports s next and d < k (k=1: s is reported first) and d is at most the round in which he was admitted; the students are split into chunks of about batch students which are searched in a pool of processes worker processes (None: one per cpu; 1: no pool); returns a sparse boolean matrix (nstud x nschool) of the obtainable schools of every student, the gain of every student (number of positions in his true list by which his best obtainable school beats his truthful assignment; an unmatched student is at the position after his list) and a dictionary with aggregate statistics (number and share of students with a gain, mean gain of all and of these students, largest gain and number of unmatched students who could get a school)"""
+    if k < 1:
+        raise ValueError('k must be at least 1')
+    match = sc.boston()
+    pref_arr, pref_len, prank_arr = sc.arrays()
+    assigned, pos = assignment(sc,match)
+    with profiling.timer('manipulation_cutoffs'):
+        cutoff = round_cutoffs(pref_arr,pref_len,prank_arr,sc.capacity,pos)
+        reach = np.maximum.accumulate(cutoff,0)
+    bounds = list(range(0,sc.nstud,max(batch,1))) + [sc.nstud]
+    tasks = [(pref_arr[a:b],pref_len[a:b],prank_arr[a:b],pos[a:b],reach,k) for a, b in zip(bounds[:-1],bounds[1:]) if b > a]
+    with profiling.timer('manipulation_search'):
+        if processes == 1:
+            results = [obtainable(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(obtainable,tasks)
+            finally:
+                pool.terminate()
+    win = np.concatenate(results) if results != [] else np.zeros(pref_arr.shape,dtype=bool)
+    best = np.where(win.any(1),win.argmax(1),pref_len)#first obtainable position of every student
+    gain = pos - best
+    rows = np.nonzero(win)[0]
+    schools = csr_matrix((np.ones(len(rows),dtype=bool),(rows,pref_arr[win])),shape=(sc.nstud,sc.nschool))
+    gainers = gain > 0
+    stats = {'manipulable':int(gainers.sum()),
+             'share':float(gainers.mean()) if sc.nstud > 0 else 0.,
+             'mean_gain':float(gain.mean()) if sc.nstud > 0 else 0.,
+             'mean_gain_manipulable':float(gain[gainers].mean()) if gainers.any() else 0.,
+             'max_gain':int(gain.max()) if sc.nstud > 0 else 0,
+             'unmatched_gain':int((gainers & (assigned < 0)).sum())}
+    return schools, gain, stats
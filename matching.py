@@ -1,32 +1,53 @@
 
 import random
+import gzip
+import time
+import heapq
+import itertools
+import json
+import struct
+import numpy as np
+from collections import deque
+import profiling
 import cPickle as pickle
 
-def read_sc(school,student):
-    """reads in data from two files: 'school' contains in line k first the capacity of school k and then the student numbers separated by ',' ordered according to k's priorities from highest to lowest priority; 'student' has in line k the preferences of student k i.e. a sequence of school numbers from best to worst separated by ',' """
-    school_file = open(school,'r')
-    capacity = []
-    priority = []
-    for line in school_file:
-        line.strip()
-        line = line.split(',')
-        num_line = []
-        for element in line:
-            num_line.append(int(element))
-        capacity.append(num_line.pop(0))
-        priority.append(num_line)
-    school_file.close()
-    stud_file = open(student,'r')
-    preference = []
-    for line in stud_file:
-        line.strip()
-        line = line.split(',')
-        num_line=[]
-        for element in line:
-            num_line.append(int(element))
-        preference.append(num_line)
-    stud_file.close()
-    return priority, capacity, preference
+def open_text(filename,mode='r'):
+    """opens a text file; files whose name ends with '.gz' (and, when reading, every file starting with the gzip magic bytes) are gzip compressed"""
+    if 'r' in mode and not filename.endswith('.gz'):
+        with open(filename,'rb') as test:
+            if test.read(2) == '\x1f\x8b':
+                return gzip.open(filename,mode)
+        return open(filename,mode)
+    if filename.endswith('.gz'):
+        return gzip.open(filename,mode)
+    return open(filename,mode)
+
+def read_chunks(filename,chunksize=100000):
+    """reads a file in the format of read_sc in blocks of chunksize lines; every block is parsed in one numpy call and returned as a flat int32 array of all numbers in the block together with the int32 array of the number of entries in each line; an empty line is a row without entries (e.g. a student with an empty preference list), only the line break at the end of the file does not start a new row"""
+    with open_text(filename) as input:
+        while True:
+            lines = [line.strip() for line in itertools.islice(input,chunksize)]
+            if lines == []:
+                break
+            lengths = np.array([line.count(',') + 1 if line != '' else 0 for line in lines],dtype=np.int32)
+            lines = [line for line in lines if line != '']
+            flat = np.fromstring(','.join(lines),dtype=np.int32,sep=',') if lines != [] else np.zeros(0,dtype=np.int32)
+            if len(flat) != lengths.sum():
+                raise ValueError('%s contains an entry that is not an integer' % filename)
+            yield flat, lengths
+
+def read_sc(school,student,chunksize=100000,verbose=False):
+    """reads in data from two files: 'school' contains in line k first the capacity of school k and then the student numbers separated by ',' ordered according to k's priorities from highest to lowest priority; 'student' has in line k the preferences of student k i.e. a sequence of school numbers from best to worst separated by ','; files can be gzip compressed; the files are parsed in blocks of chunksize lines, verbose=True prints the number of rows read per second"""
+    start = time.time()
+    prio, prio_off, capacity = read_flat(school,True,chunksize)
+    pref, pref_off = read_flat(student,False,chunksize)[:2]
+    priority = [row.tolist() for row in split(prio,prio_off)]
+    preference = [row.tolist() for row in split(pref,pref_off)]
+    if verbose:
+        rows = len(priority) + len(preference)
+        seconds = max(time.time() - start,1e-9)
+        print '%d rows read in %.3f seconds (%d rows per second)' % (rows,seconds,rows/seconds)
+    return priority, capacity.tolist(), preference
 
 
 def gen_sc(nschool,nstud,overcap=False,maxovercap=False,savefile=False):
@@ -80,9 +101,384 @@ def gen_sc(nschool,nstud,overcap=False,maxovercap=False,savefile=False):
         stud_file.close()
     return priority, capacity, preference
 
+def draw_capacity(nschool,nstud,overcap=False,maxovercap=False,rng=np.random):
+    """school capacities drawn from the triangular distribution of gen_sc without rejection loop: if the total capacity violates the constraints (at least nstud places if overcap==True, at most nstud + maxovercap places if maxovercap is given), the draws are rescaled to the nearest feasible total and rounded by the largest remainder method, so the constraint holds exactly; returns an int64 array"""
+    average = float(nstud)/nschool
+    draw = rng.triangular(average/10.0,0.2*average,3*average,nschool)
+    capacity = draw.astype(np.int64)
+    low = nstud if overcap == True else 0
+    high = nstud + maxovercap if maxovercap != False else np.inf
+    if low > high:
+        raise ValueError('overcap and maxovercap=%s cannot both hold' % maxovercap)
+    total = capacity.sum()
+    if low <= total <= high:
+        return capacity
+    total = int(min(max(total,low),high))
+    share = draw*total/draw.sum()
+    capacity = np.floor(share).astype(np.int64)
+    rest = total - capacity.sum()#places left after rounding down go to the largest remainders
+    if rest > 0:
+        capacity[np.argpartition(capacity - share,rest - 1)[:rest]] += 1
+    return capacity
+
+def random_orders(out,correlation=0.,common=None,rng=np.random,chunksize=10**7,ncol=None):
+    """fills the int32 matrix out (rows x columns) with random orderings of the column numbers 0..ncol-1 (default: the number of columns of out; if out has fewer columns, every row contains its best out.shape[1] columns in order): row j ranks the columns by decreasing utility sqrt(correlation)*common + sqrt(1-correlation)*e_j where common (one value per column) is shared by all rows and e_j is standard normal noise of row j; correlation=0 gives independent uniformly random permutations, correlation=1 the order of common in every row; rows are drawn in blocks of about chunksize entries and sorted in one call per block (wide rows without correlation are shuffled one at a time)"""
+    nrow, width = out.shape
+    ncol = width if ncol is None else ncol
+    if correlation == 0 and ncol > chunksize//16:
+        for j in range(nrow):
+            out[j] = rng.permutation(ncol)[:width]
+        return out
+    if correlation == 0 and 4*width <= ncol:#short uniform lists: draw the entries directly and redraw the few rows with a repeated column
+        out[:] = rng.randint(0,ncol,out.shape)
+        redraw = np.arange(nrow)
+        while len(redraw) > 0:
+            rows = np.sort(out[redraw],axis=1)
+            redraw = redraw[(rows[:,1:] == rows[:,:-1]).any(1)]
+            out[redraw] = rng.randint(0,ncol,(len(redraw),width))
+        return out
+    block = max(chunksize//max(ncol,1),1)
+    for start in range(0,nrow,block):
+        stop = min(start + block,nrow)
+        if correlation == 0:
+            utility = rng.random_sample((stop - start,ncol))
+        else:
+            utility = np.sqrt(correlation)*common + np.sqrt(1 - correlation)*rng.standard_normal((stop - start,ncol))
+        if width < ncol:#only the best width columns are sorted
+            top = np.argpartition(-utility,width - 1,axis=1)[:,:width]
+            out[start:stop] = np.take_along_axis(top,np.argsort(-np.take_along_axis(utility,top,1),axis=1),1)
+        else:
+            out[start:stop] = np.argsort(-utility,axis=1)
+    return out
+
+def gen_sc_fast(nschool,nstud,overcap=False,maxovercap=False,savefile=False,correlation=0.,prio_correlation=0.,tiers=1,tier_gap=1.,seed=None,lists=False,listlen=None,dummy=True):
+    """numpy version of gen_sc for large problems: capacities are drawn by draw_capacity, preferences and priorities by random_orders; correlation is the weight of the common value (school quality) in the students' utilities, prio_correlation the weight of a common student score in the schools' priorities (0: independent uniform orderings as in gen_sc, 1: all students resp. schools have the same ordering); with tiers > 1 the schools are randomly split into tiers and the quality of a school in tier t (0 is the best tier) is raised by tier_gap*(tiers-1-t) standard deviations; seed is the seed of a numpy RandomState (None: numpy's global random state); listlen limits the preference lists to the best listlen schools of every student (None: all schools are ranked) and every school then only ranks the students that list it; as in gen_sc, a dummy school is added if there are fewer places than students (unless dummy=False: then students can remain unassigned) and savefile=True saves the problem in school.txt and student.txt; returns priority (int32 matrix with one row per school or, if listlen is given, a list of int32 arrays), capacity (int64 array) and preference (int32 matrix, one row per student) or, with lists=True, lists as gen_sc"""
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    capacity = draw_capacity(nschool,nstud,overcap,maxovercap,rng)
+    extra = dummy and capacity.sum() < nstud
+    width = nschool if listlen is None else min(listlen,nschool)
+    quality = rng.standard_normal(nschool)
+    if tiers > 1:
+        quality = quality + tier_gap*(tiers - 1 - rng.randint(0,tiers,nschool))
+    preference = np.empty((nstud,width + extra),dtype=np.int32)
+    random_orders(preference[:,:width],correlation,quality,rng,ncol=nschool)
+    if width < nschool:#schools only rank their applicants, so the problem size is linear in the number of listed pairs
+        priority = applicant_orders(preference[:,:width],nschool,prio_correlation,rng)
+        if extra:
+            priority.append(np.arange(nstud,dtype=np.int32))
+    else:
+        priority = np.empty((nschool + extra,nstud),dtype=np.int32)
+        random_orders(priority[:nschool],prio_correlation,rng.standard_normal(nstud),rng)
+        if extra:
+            priority[nschool] = np.arange(nstud)
+    if extra:#dummy school "nschool+1", last in every preference list, see gen_sc
+        preference[:,width] = nschool
+        capacity = np.append(capacity,nstud)
+    if savefile != False:
+        save_sc(priority,capacity,preference)
+    if lists:
+        return [np.asarray(prio).tolist() for prio in priority], capacity.tolist(), preference.tolist()
+    return priority, capacity, preference
+
+def applicant_orders(preference,nschool,correlation=0.,rng=np.random):
+    """random priority orderings of the students that list each school in the matrix preference (one row per student): the utility of student j for a school is sqrt(correlation)*score_j + sqrt(1-correlation)*e with a standard normal score of j shared by all schools and standard normal noise e (as in random_orders); returns a list with an int32 array (a view into one flat array) per school"""
+    nstud, width = preference.shape
+    school = preference.ravel()
+    stud = np.repeat(np.arange(nstud,dtype=np.int32),width)
+    if correlation == 0:
+        key = rng.randint(0,2**31,len(school)).astype(np.int64)#random order within each school
+    else:
+        utility = np.sqrt(correlation)*rng.standard_normal(nstud)[stud] + np.sqrt(1 - correlation)*rng.standard_normal(len(school))
+        key = np.empty(len(school),dtype=np.int64)
+        key[np.argsort(-utility)] = np.arange(len(school))#position of each pair in the order of decreasing utility
+    order = np.argsort(school.astype(np.int64)*2**32 + key)#pairs grouped by school, best student first (one sort of packed keys)
+    flat = stud[order]
+    bounds = np.searchsorted(school[order],np.arange(nschool + 1)).tolist()
+    return [flat[bounds[k]:bounds[k + 1]] for k in range(nschool)]
+
+def save_sc(priority,capacity,preference,school='school.txt',student='student.txt',chunksize=100000):
+    """saves a school choice problem in the files 'school' and 'student' in the format of read_sc (file names ending with '.gz' are gzip compressed); lines are written in blocks of chunksize lines"""
+    capacity = np.asarray(capacity).tolist()
+    for filename, table, first_entry in [(school,priority,capacity),(student,preference,None)]:
+        with open_text(filename,'w') as output:
+            for first in range(0,len(table),chunksize):
+                rows = table[first:first + chunksize]
+                rows = rows.tolist() if isinstance(rows,np.ndarray) else [list(row) for row in rows]
+                if first_entry is not None:#capacity is the first number of a school's line
+                    rows = [[first_entry[first + k]] + row for k, row in enumerate(rows)]
+                output.write('\n'.join([','.join(map(str,row)) for row in rows]) + '\n')
+
+def deferred_acceptance(pref_arr,pref_len,prank_arr,capacity,ineligible=None):
+    """student proposing deferred acceptance algorithm on the arrays returned by pref_array and pair_rank_array (prank_arr[j,p] is the priority position of student j at the pth school of his list; any numbers that order the students, e.g. lottery numbers as in lottery.py, can be used instead) and the list of school capacities; pairs with prank_arr at least ineligible (default: the number of students) are not eligible; returns the match as a list of lists where the kth lower level list contains the students matched with school k ordered according to k's priority; students that are rejected by every school on their (possibly short) list remain unmatched"""
+    nstud = len(pref_len)
+    ineligible = nstud if ineligible is None else ineligible
+    preference = pref_arr.tolist()
+    rank = prank_arr.tolist()#rank[stud][pos]: only the listed pairs are stored
+    length = pref_len.tolist()
+    held = [[] for k in range(len(capacity))]#kth list is a heap of (-rank,student) tuples of the students tentatively accepted by school k, i.e. the student with the lowest priority is on top
+    nextpos = [0]*nstud#position in the preference list of the school a student will propose to next
+    free = deque(range(nstud))#queue of students that are not tentatively accepted anywhere
+    while free:
+        stud = free.popleft()
+        while stud is not None and nextpos[stud] < length[stud]:#follows the rejection chain started by stud's proposal
+            school = preference[stud][nextpos[stud]]
+            r = rank[stud][nextpos[stud]]
+            nextpos[stud] = nextpos[stud] + 1
+            heap = held[school]
+            if r >= ineligible:#stud is not eligible at school and is rejected
+                continue
+            if len(heap) < capacity[school]:#free seat: stud is accepted and the chain ends
+                heapq.heappush(heap,(-r,stud))
+                stud = None
+            elif heap != [] and -heap[0][0] > r:#stud has higher priority than the worst accepted student who is rejected instead
+                stud = heapq.heapreplace(heap,(-r,stud))[1]
+    if profiling.enabled:
+        profiling.count('gs_proposals',sum(nextpos))
+    match = []
+    for heap in held:
+        match.append([item[1] for item in sorted(heap,reverse=True)])
+    return match
+
+def efficiency_adjusted_da(pref_arr,pref_len,prank_arr,capacity,ineligible=None):
+    """efficiency adjusted deferred acceptance (Kesten) with all students consenting on the arrays returned by pref_array and pair_rank_array (ineligible as in deferred_acceptance), computed as simplified EADA (Tang and Yu): in every round, the schools that no remaining student desires (is eligible at and prefers to his assigned school) keep their students for good and leave the problem together with them and the unmatched students, and the student optimal stable match of the remaining problem is found; deferred acceptance is run only once: the old match stays stable in the remaining problem and is improved by cycles in which every school admits the student with the highest priority among those desiring it (this student leaves the next school of the cycle) until there is no such cycle; returns the match as in deferred_acceptance"""
+    nstud = len(pref_len)
+    ineligible = nstud if ineligible is None else ineligible
+    nschool = len(capacity)
+    match = deferred_acceptance(pref_arr,pref_len,prank_arr,capacity,ineligible)
+    school = np.full(nstud,-1,dtype=np.int64)#assigned school of every student
+    for k in range(nschool):
+        school[match[k]] = k
+    pos = np.array(pref_len,dtype=np.int64)#position of the assigned school in the student's list (length of the list if unmatched)
+    matched = school >= 0
+    pos[matched] = (pref_arr[matched] == school[matched][:,None]).argmax(1)
+    desired = (np.arange(pref_arr.shape[1]) < pos[:,None]) & (prank_arr < ineligible)#only a student who desires a school after deferred acceptance can desire it later
+    studs, places = np.nonzero(desired)
+    order = np.argsort(pref_arr[desired].astype(np.int64)*2**32 + prank_arr[desired])#pairs by school and within a school by priority (one sort of packed keys)
+    bounds = np.searchsorted(pref_arr[desired][order],np.arange(nschool + 1)).tolist()
+    cand_stud = studs[order].tolist()
+    cand_pos = places[order].tolist()#position of the school in the student's list
+    school, pos = school.tolist(), pos.tolist()
+    members = [set(held) for held in match]#students of every school
+    ptr = bounds[:-1]#students before ptr[k] never desire school k again
+    left = [False]*nstud#students that left the problem
+    closed = [False]*nschool#schools that left the problem
+    def best(k):#index of the student with the highest priority among the remaining students desiring school k or None; the set of students desiring k only shrinks
+        i = ptr[k]
+        while i < bounds[k + 1] and (left[cand_stud[i]] or cand_pos[i] >= pos[cand_stud[i]]):
+            i = i + 1
+        ptr[k] = i
+        return i if i < bounds[k + 1] else None
+    def improve():#eliminates improvement cycles until the match is the student optimal stable match of the remaining problem; returns the number of cycles
+        dead = list(closed)#schools that cannot be on a cycle in this round
+        onpath = [-1]*nschool
+        path = []#walk of schools, the best student desiring path[i] is at path[i+1]
+        start = 0
+        ncycle = 0
+        while True:
+            if path == []:
+                while start < nschool and dead[start]:
+                    start = start + 1
+                if start == nschool:
+                    break
+                path.append(start)
+                onpath[start] = 0
+            k = path[-1]
+            i = best(k)
+            nxt = school[cand_stud[i]] if i is not None else None
+            if nxt is None or dead[nxt]:#nobody desires k or the student desiring k cannot move
+                dead[k] = True
+                onpath[k] = -1
+                path.pop()
+            elif onpath[nxt] == -1:#extend the walk
+                onpath[nxt] = len(path)
+                path.append(nxt)
+            else:#cycle found: every school of the cycle admits its best desiring student
+                cycle = path[onpath[nxt]:]
+                del path[onpath[nxt]:]
+                moves = [(k, best(k)) for k in cycle]
+                for k, i in moves:
+                    stud = cand_stud[i]
+                    members[school[stud]].remove(stud)
+                    members[k].add(stud)
+                    school[stud] = k
+                    pos[stud] = cand_pos[i]
+                    onpath[k] = -1
+                ncycle = ncycle + 1
+        return ncycle
+    out = [[] for k in range(nschool)]
+    leaving = [j for j in range(nstud) if school[j] < 0]
+    remaining = nstud
+    rounds = 0
+    ncycle = 0
+    while remaining > 0:
+        rounds = rounds + 1
+        under = [k for k in range(nschool) if not closed[k] and best(k) is None]
+        if leaving == [] and sum([len(members[k]) for k in under]) == 0:#cannot happen (Tang and Yu show that some school with students is underdemanded): everybody keeps his school
+            under = [k for k in range(nschool) if not closed[k]]
+        for k in under:
+            out[k] = sorted(members[k],key=lambda j: prank_arr[j,pos[j]])
+            leaving.extend(out[k])
+            closed[k] = True
+        for j in leaving:
+            left[j] = True
+        remaining = remaining - len(leaving)
+        leaving = []
+        ncycle = ncycle + improve()
+    profiling.count('eada_rounds',rounds)
+    profiling.count('eada_cycles',ncycle)
+    return out
+
+def top_trading_cycles(pref_arr,pref_len,prank_arr,priority,capacity):
+    """top trading cycle algorithm on the arrays returned by pref_array and pair_rank_array, the priority lists and capacity as in schoolchoice (the lists are not changed); students only point to schools on their list at which they are eligible; returns the match as a list of lists where the kth lower level list contains the students matched with school k in the order in which they were matched; students whose preference list runs out remain unmatched"""
+    nstud = len(pref_len)
+    preference = pref_arr.tolist()
+    rank = prank_arr.tolist()
+    length = pref_len.tolist()
+    nschool = len(capacity)
+    counter = list(capacity)#remaining seats of each school
+    removed = [False]*nstud#True if a student is matched (or cannot be matched anymore)
+    stud_ptr = [0]*nstud#position in the preference list of the school a student points to
+    school_ptr = [0]*nschool#position in the priority list of the student a school points to
+    onpath = [-1]*nstud#position of a student in path or -1 if he is not on path
+    match = [[] for k in range(nschool)]
+    ncycle = 0#number of cycles found
+    def top_school(stud):#school stud points to (skipping full schools and schools where stud is not eligible) or None
+        pref = preference[stud]
+        rk = rank[stud]
+        pos = stud_ptr[stud]
+        while pos < length[stud] and (counter[pref[pos]] == 0 or rk[pos] >= nstud):
+            pos = pos + 1
+        stud_ptr[stud] = pos
+        if pos < length[stud]:
+            return pref[pos]
+        return None
+    def top_stud(school):#student school points to (skipping removed students) or None
+        prio = priority[school]
+        pos = school_ptr[school]
+        while pos < len(prio) and removed[prio[pos]]:
+            pos = pos + 1
+        school_ptr[school] = pos
+        if pos < len(prio):
+            return prio[pos]
+        return None
+    path = []#students on the current walk, path[i+1] is the student pointed to by the school path[i] points to
+    start = 0#all students before start are removed
+    while True:
+        if path == []:
+            while start < nstud and removed[start]:
+                start = start + 1
+            if start == nstud:
+                break
+            path.append(start)
+            onpath[start] = 0
+        stud = path[-1]
+        school = top_school(stud)
+        if school is not None:
+            nxt = top_stud(school)
+            if nxt is None:#no student left to point to: the school is closed
+                counter[school] = 0
+                continue
+        if school is None:#stud's list is exhausted: he stays unmatched
+            removed[stud] = True
+            onpath[stud] = -1
+            path.pop()
+            continue
+        if onpath[nxt] == -1:#extend the walk
+            onpath[nxt] = len(path)
+            path.append(nxt)
+            continue
+        cycle = path[onpath[nxt]:]#cycle found: every student gets the school he points to
+        del path[onpath[nxt]:]
+        ncycle = ncycle + 1
+        for stud in cycle:
+            school = preference[stud][stud_ptr[stud]]
+            match[school].append(stud)
+            counter[school] = counter[school] - 1
+            removed[stud] = True
+            onpath[stud] = -1
+    profiling.count('ttc_cycles',ncycle)
+    return match
+
+def flatten(lists):
+    """returns the lists (e.g. priority or preference) concatenated in one int32 array and the int32 array of their lengths"""
+    lengths = np.array([len(item) for item in lists],dtype=np.int32)
+    if len(lists) > 0 and isinstance(lists[0],np.ndarray):#rows of a problem opened with open_scb
+        return np.concatenate(lists).astype(np.int32), lengths
+    return np.fromiter(itertools.chain.from_iterable(lists),dtype=np.int32,count=lengths.sum()), lengths
+
+def pref_array(preference):
+    """returns the preference lists as an int32 matrix with one row per student (shorter lists are padded with -1) and the int32 array of list lengths"""
+    if isinstance(preference,np.ndarray) and preference.ndim == 2:#matrix as returned by gen_sc_fast: used as it is
+        return preference.astype(np.int32,copy=False), np.full(len(preference),preference.shape[1],dtype=np.int32)
+    flat, pref_len = flatten(preference)
+    width = max(pref_len.max(),1) if len(preference) > 0 else 1
+    pref_arr = np.full((len(preference),width),-1,dtype=np.int32)
+    pref_arr[np.arange(width) < pref_len[:,None]] = flat
+    return pref_arr, pref_len
+
+def pair_rank_array(pref_arr,pref_len,priority,nstud):
+    """priority positions of the listed pairs: element [j,p] is the position of student j in the priority ordering of the pth school on his list (pref_arr and pref_len as returned by pref_array); nstud if j is not eligible there or p >= pref_len[j]; memory and time are linear in the number of listed pairs and the length of the priority lists, no school x student table is built"""
+    prank = np.full(pref_arr.shape,nstud,dtype=np.int32)
+    listed = np.nonzero((np.arange(pref_arr.shape[1]) < pref_len[:,None]).ravel())[0]#flat positions of the listed pairs
+    school = pref_arr.ravel()[listed]
+    order = np.argsort(school)#listed pairs grouped by school
+    listed = listed[order]
+    bounds = np.searchsorted(school[order],np.arange(len(priority) + 1)).tolist()
+    prio_flat, prio_len = flatten(priority)
+    prio_off = np.concatenate(([0],np.cumsum(prio_len,dtype=np.int64))).tolist()
+    position = np.full(nstud,nstud,dtype=np.int32)#priority positions at the current school
+    flat = prank.ravel()
+    for k in range(len(priority)):
+        if bounds[k] == bounds[k + 1]:#nobody lists school k
+            continue
+        prio = prio_flat[prio_off[k]:prio_off[k + 1]]
+        position[prio] = np.arange(len(prio),dtype=np.int32)
+        pairs = listed[bounds[k]:bounds[k + 1]]
+        flat[pairs] = position[pairs//pref_arr.shape[1]]
+        position[prio] = nstud
+    return prank
+
+def immediate_acceptance(pref_arr,pref_len,prank_arr,capacity,ineligible=None):
+    """Boston (immediate acceptance) algorithm on the arrays returned by pref_array and pair_rank_array (ineligible as in deferred_acceptance); returns the match as a list of lists where the kth lower level list contains the students matched with school k, ordered by the round in which they were accepted and within a round by k's priority"""
+    nstud = len(pref_len)
+    ineligible = nstud if ineligible is None else ineligible
+    capa = np.array(capacity,dtype=np.int64)
+    active = np.arange(nstud)#students that are not matched yet
+    acc_school = []#per round: schools of the accepted proposals
+    acc_stud = []#per round: accepted students
+    depth = 0#every active student proposes to the school at this position of his preference list
+    while True:
+        active = active[pref_len[active] > depth]#students whose list is exhausted stay unmatched
+        if len(active) == 0:
+            break
+        school = pref_arr[active,depth]
+        r = prank_arr[active,depth]
+        order = np.lexsort((r,school))#proposals grouped by school, within school by priority
+        active, school, r = active[order], school[order], r[order]
+        first = np.searchsorted(school,school)#index of the first proposal to the same school
+        accepted = (np.arange(len(school)) - first < capa[school]) & (r < ineligible)
+        capa = capa - np.bincount(school[accepted],minlength=len(capa))
+        acc_school.append(school[accepted])
+        acc_stud.append(active[accepted])
+        active = active[~accepted]
+        depth = depth + 1
+    profiling.count('boston_rounds',depth)
+    if acc_school == []:
+        return [[] for k in range(len(capa))]
+    school = np.concatenate(acc_school)
+    order = np.argsort(school,kind='mergesort')#stable: keeps the round order within a school
+    studs = np.concatenate(acc_stud)[order].tolist()
+    bounds = np.cumsum(np.bincount(school,minlength=len(capa))).tolist()
+    match = []
+    start = 0
+    for end in bounds:
+        match.append(studs[start:end])
+        start = end
+    return match
+
 class schoolchoice:
     def __init__(self,priority, capacity, preference):
-        """read in data: priorities is a list of lists where the kth lower level list is the priority of school k, capacity is a list of school capacities (same order of schools as in priority), preferences is a list of lists where the ith sublist is the preference ranking of student i"""
+        """read in data: priorities is a list of lists where the kth lower level list is the priority of school k, capacity is a list of school capacities (same order of schools as in priority), preferences is a list of lists where the ith sublist is the preference ranking of student i; lists can be truncated: a student only applies to the schools on his list and is eligible only at schools that list him"""
         self.priority = priority
         self.capacity = capacity
         self.preference = preference
@@ -90,115 +486,53 @@ class schoolchoice:
         if self.nschool != len(priority):
             print "input error: capacity and priority list must have same length"
         self.nstud = len(preference)
+        self.pref_arr = None#will contain the preferences as int32 matrix (see pref_array) once it is needed
+        self.pref_len = None#length of each student's preference list
+        self.prank_arr = None#will contain the priority positions of the listed pairs as int32 matrix (see pair_rank_array) once it is needed
         self.gs_match = []#will contain Gale Shapley match if this is calculated
         self.boston_match = []
         self.ttc_match = []
+        self.eada_match = []
     #
     def gs(self):
         """uses the Gale Shapley student proposing algorithm to solve the matching problem"""
-        flag = 0 #dummy used to indicate whether the algorithm has finished
-        pref = list(self.preference) #useful as the algorithm manipulates this list
-        while flag == 0:
-            flag = 1
-            match = []#contains list of lists where the kth lower level list are the students matched with school k
-            unmatched = []#list of unmatched students
-            for i in range(self.nschool):
-                proposers = filter(lambda x: i==pref[x][0],self.priority[i])# list of students proposing to i in this round
-                if len(proposers)<=self.capacity[i]:
-                    match.append(proposers)
-                else:
-                    match.append(proposers[:self.capacity[i]])
-                    unmatched = unmatched +proposers[self.capacity[i]:]
-            if unmatched != []:
-                flag = 0
-                for j in unmatched:
-                    pref[j]=pref[j][1:]#pref[j].pop(0) #deletes the top preference for the unmatched
+        pref_arr, pref_len, prank_arr = self.arrays()
+        with profiling.timer('gs'):
+            match = deferred_acceptance(pref_arr,pref_len,prank_arr,self.capacity)
         self.gs_match = list(match)
         return match
     #
     def ttc(self):
         """Uses the top trading cycle algorithm on the matching problem"""
-        unmatched = range(self.nstud)#unmatched students
-        match = [[] for i in range(self.nschool)]#contains list of lists where the kth lower level list are the students matched with school k
-        pref = list(self.preference)
-        priori = list(self.priority)
-        counter = list(self.capacity)
-        while unmatched != []:
-            cyc_stud = [unmatched[0]]
-            cyc_school = [pref[unmatched[0]][0]]
-            cyc_closed = False#indicates whether we have a cycle
-            while cyc_closed == False:
-                top_stud = priori[cyc_school[len(cyc_school)-1]][0]#student with highest priority in last school in cyc_school
-                if top_stud in cyc_stud:
-                    cyc_closed = True
-                    cyc_stud = cyc_stud[cyc_stud.index(top_stud):] #deletes the students that are not par tof the cycle
-                    for stud in cyc_stud:
-                        school0 = pref[stud][0]#the school to which stud is matched
-                        unmatched.remove(stud)#removes the student from unmatched
-                        match[school0].append(stud)#adds the student to match
-                        counter[school0] = counter[school0] - 1#decreases capacity counter
-                        for k in range(self.nschool):#removes the matched student from all schools priorities
-                            try:#using "try" avoids error if stud is not elligible at a certain school, i.e. not in its priority ranking
-                                priori[k].remove(stud)
-                            except:
-                                pass
-                        if counter[school0] == 0:#removes schools that have no capacity left from remaining students preferences
-                            for j in range(self.nstud):
-                                try:#the remove command below returns an error if a student did not list school0 in his preferences
-                                    pref[j].remove(school0)
-                                except:
-                                    pass
-                else:
-                    cyc_stud.append(top_stud)
-                top_school = pref[cyc_stud[len(cyc_stud)-1]][0]#most preferred school of last student in cyc_stud
-                if top_school in cyc_school and cyc_closed == False:
-                    cyc_closed = True
-                    cyc_school = cyc_school[cyc_school.index(top_school):]
-                    for school in cyc_school:
-                        stud = priori[school][0]#student to which school points
-                        unmatched.remove(stud)#student is removed from unmatched
-                        match[school].append(stud)#adds the student to match
-                        counter[school] = counter[school] - 1#reduce counter by 1
-                        for k in range(self.nschool):#removes the matched student from all schools priorities
-                            try:#using "try" avoids error if stud is not elligible at a certain school, i.e. not in its priority ranking
-                                priori[k].remove(stud)
-                            except:
-                                pass
-                        if counter[school] == 0:#removes schools that have no capacity left from remaining students preferences
-                            for j in range(self.nstud):
-                                try:
-                                    pref[j].remove(school)
-                                except:
-                                    pass
-                elif cyc_closed == False:
-                    cyc_school.append(top_school)
+        pref_arr, pref_len, prank_arr = self.arrays()
+        with profiling.timer('ttc'):
+            match = top_trading_cycles(pref_arr,pref_len,prank_arr,self.priority,self.capacity)
         self.ttc_match = list(match)
         return match
     #
+    def arrays(self):
+        """returns the preference matrix, the preference list lengths and the priority positions of the listed pairs (see pref_array and pair_rank_array); they are calculated on the first call and saved"""
+        if getattr(self,'prank_arr',None) is None:#problems saved before pair ranks were introduced have no prank_arr
+            with profiling.timer('arrays'):
+                self.pref_arr, self.pref_len = pref_array(self.preference)
+                self.prank_arr = pair_rank_array(self.pref_arr,self.pref_len,self.priority,self.nstud)
+        return self.pref_arr, self.pref_len, self.prank_arr
+    #
     def boston(self):
         """uses the Boston school matching algorithm to solve the matching problem"""
-        flag = 0 #dummy used to indicate whether the algorithm has finished
-        pref = list(self.preference) #useful as the algorithm manipulates this list
-        capa = list(self.capacity) #useful as the algorithm manipulates this list
-        match = [[] for i in range(self.nschool)] #list of nschool empty lists, kth list is list of students at school k
-        while flag == 0:
-            flag = 1
-            unmatched = []#list of unmatched students
-            for i in range(self.nschool):
-                proposers = filter(lambda x: i==pref[x][0] and x not in match[i],self.priority[i])# list of students proposing to i in this round
-                if len(proposers)<=capa[i]:
-                    match[i] = match[i] + proposers
-                    capa[i] = capa[i] - len(proposers)
-                else:
-                    match[i] = match[i] + proposers[:capa[i]]
-                    unmatched = unmatched + proposers[capa[i]:]
-                    capa[i] = 0
-            if unmatched != []:
-                flag = 0
-                for j in unmatched:
-                    pref[j].pop(0) #deletes the top preference for the unmatched
+        pref_arr, pref_len, prank_arr = self.arrays()
+        with profiling.timer('boston'):
+            match = immediate_acceptance(pref_arr,pref_len,prank_arr,self.capacity)
         self.boston_match = list(match)
         return match
+    #
+    def eada(self):
+        """uses efficiency adjusted deferred acceptance (all students consent) to solve the matching problem; the match Pareto improves the Gale Shapley match for the students"""
+        pref_arr, pref_len, prank_arr = self.arrays()
+        with profiling.timer('eada'):
+            match = efficiency_adjusted_da(pref_arr,pref_len,prank_arr,self.capacity)
+        self.eada_match = list(match)
+        return match
 
 def save_scp(scp,filename):
     """saves an existing school choice problem with name scp as filename; advantage: will also save previously calculated matches and not only preferences etc."""
@@ -210,22 +544,101 @@ def open_scp(filename):
     with open(filename,'rb') as input:
         return pickle.load(input)
 
-def save_match(match,filename_school='match_school.txt',filename_student='match_student.txt'):
-    """saves a given match in 2 files: 'match_school' contains in line k the student numbers matched to school k; 'match_student' contains in line k the school matched to student k"""
-    student_lst1 = []
-    school_lst = open(filename_school,'w')
-    for school in range(len(match)):
-        for student in match[school]:
-            student_lst1.append((student,school))
-        line = str(match[school])
-        line = line.strip('[')
-        line = line.strip(']')
-        school_lst.write(line)
-        school_lst.write('\n')
-    student_lst1 = sorted(student_lst1)
-    student_lst = open(filename_student,'w')
-    for item in student_lst1:
-        student_lst.write(str(item[1]))
-        student_lst.write('\n')
-    student_lst.close()
-    school_lst.close()
+SCB_MAGIC = 'SCB1'#first bytes of a binary school choice file
+SCB_ALIGN = 64#arrays in the file start at multiples of this number of bytes
+
+def save_scb(scp,filename):
+    """saves the school choice problem scp in the binary format read by open_scb: capacity, priorities and preferences as flat int32 arrays with int64 offset arrays (row k is flat[off[k]:off[k+1]]) and previously calculated matches in the same way"""
+    arrays = [('capacity',np.asarray(scp.capacity,dtype=np.int32))]
+    for name in ['priority','preference','gs_match','ttc_match','boston_match','eada_match']:
+        lists = getattr(scp,name,[])#problems saved before eada was introduced have no eada_match
+        if name.endswith('_match') and lists == []:#match not calculated
+            continue
+        flat, lengths = flatten(lists)
+        arrays.append((name,flat))
+        arrays.append((name + '_off',np.concatenate(([0],np.cumsum(lengths,dtype=np.int64)))))
+    layout = []
+    offset = 0
+    for name, arr in arrays:
+        layout.append([name,arr.dtype.newbyteorder('<').str,len(arr),offset])
+        offset = offset + -(-arr.nbytes//SCB_ALIGN)*SCB_ALIGN
+    header = json.dumps({'nschool':scp.nschool,'nstud':scp.nstud,'arrays':layout})
+    start = -(-(len(SCB_MAGIC) + 8 + len(header))//SCB_ALIGN)*SCB_ALIGN#beginning of the data
+    with open(filename,'wb') as output:
+        output.write(SCB_MAGIC)
+        output.write(struct.pack('<Q',len(header)))
+        output.write(header)
+        for (name, arr), item in zip(arrays,layout):
+            output.seek(start + item[3])
+            output.write(arr.astype(item[1]).tobytes())
+        output.truncate(start + offset)
+
+def split(flat,off):
+    """row views flat[off[k]:off[k+1]] of a flat array (no copies)"""
+    off = off.tolist()
+    return [flat[off[k]:off[k + 1]] for k in range(len(off) - 1)]
+
+def open_scb(filename):
+    """returns the school choice problem saved by save_scb (or convert_sc) in filename; the file is memory mapped read-only, i.e. priorities and preferences are numpy views into the file which are not copied into memory (several processes opening the same file share it); saved matches are returned as lists"""
+    with open(filename,'rb') as input:
+        if input.read(len(SCB_MAGIC)) != SCB_MAGIC:
+            raise ValueError('%s is not a binary school choice file' % filename)
+        length = struct.unpack('<Q',input.read(8))[0]
+        header = json.loads(input.read(length))
+    start = -(-(len(SCB_MAGIC) + 8 + length)//SCB_ALIGN)*SCB_ALIGN
+    data = np.memmap(filename,dtype=np.uint8,mode='r')
+    arrays = {}
+    for name, dtype, size, offset in header['arrays']:
+        dtype = np.dtype(str(dtype))
+        arrays[name] = data[start + offset:start + offset + size*dtype.itemsize].view(dtype)
+    scp = schoolchoice(split(arrays['priority'],arrays['priority_off']),arrays['capacity'],split(arrays['preference'],arrays['preference_off']))
+    for name in ['gs_match','ttc_match','boston_match','eada_match']:
+        if name in arrays:
+            setattr(scp,name,[match.tolist() for match in split(arrays[name],arrays[name + '_off'])])
+    return scp
+
+def read_flat(filename,capacity=False,chunksize=100000):
+    """reads a file in the format of read_sc into one flat int32 array and an int64 offset array (row k is flat[off[k]:off[k+1]]); if capacity is True, the first number of each line is returned separately as capacity array; the file is parsed in blocks of chunksize lines (see read_chunks), no python lists of lists are created"""
+    flats = []
+    lengths = []
+    for flat, length in read_chunks(filename,chunksize):
+        flats.append(flat)
+        lengths.append(length)
+    flat = np.concatenate(flats) if flats != [] else np.zeros(0,dtype=np.int32)
+    lengths = np.concatenate(lengths) if lengths != [] else np.zeros(0,dtype=np.int32)
+    off = np.concatenate(([0],np.cumsum(lengths,dtype=np.int64)))
+    if not capacity:
+        return flat, off, np.zeros(0,dtype=np.int32)
+    first = off[:-1]#position of the capacity in each line
+    keep = np.ones(len(flat),dtype=bool)
+    keep[first] = False
+    return flat[keep], off - np.arange(len(off)), flat[first]
+
+def convert_sc(school,student,filename):
+    """converts a school choice problem saved in the text files 'school' and 'student' (format as in read_sc) into the binary format of save_scb without building python lists"""
+    prio, prio_off, capacity = read_flat(school,True)
+    pref, pref_off = read_flat(student)[:2]
+    scp = schoolchoice(split(prio,prio_off),capacity,split(pref,pref_off))
+    save_scb(scp,filename)
+    return scp
+
+def save_match(match,filename_school='match_school.txt',filename_student='match_student.txt',nstud=None,chunksize=100000,verbose=False):
+    """saves a given match in 2 files: 'match_school' contains in line k the student numbers matched to school k; 'match_student' contains in line k the school matched to student k (-1 if student k is unmatched); nstud is the number of students of the problem (e.g. sc.nstud) and has to be given, as unmatched students with high numbers do not appear in match; file names ending with '.gz' are gzip compressed; lines are written in blocks of chunksize lines, verbose=True prints the number of rows written per second"""
+    start = time.time()
+    if nstud is None:
+        raise ValueError('save_match needs the number of students nstud')
+    school_of = np.full(nstud,-1,dtype=np.int32)#school of every student
+    with open_text(filename_school,'w') as school_lst:
+        for first in range(0,len(match),chunksize):
+            lines = []
+            for school in range(first,min(first + chunksize,len(match))):
+                school_of[match[school]] = school
+                lines.append(', '.join([str(stud) for stud in match[school]]))
+            school_lst.write('\n'.join(lines) + '\n')
+    with open_text(filename_student,'w') as student_lst:
+        for first in range(0,nstud,chunksize):
+            student_lst.write('\n'.join(map(str,school_of[first:first + chunksize].tolist())) + '\n')
+    if verbose:
+        rows = len(match) + nstud
+        seconds = max(time.time() - start,1e-9)
+        print '%d rows written in %.3f seconds (%d rows per second)' % (rows,seconds,rows/seconds)
@@ -0,0 +1,81 @@
+""" Expected payoffs of all actions of all players against mixed strategy profiles.
+The payoffs are given in the same format as in Nash_eq_solver2.py: payoffs[a_{n-1}]...[a_0][i]
+is the payoff of player i in the action profile (a_0,...,a_{n-1}).
+A mixed strategy profile is a list of n arrays (one per player). An array can have leading
+batch dimensions, e.g. shape (B,a_i) for B profiles, which are evaluated at once. """
+
+import numpy as np
+import profiling
+
+def player_tensors(payoffs):
+    """turns payoffs in the format of Nash_eq_solver2.py into an array U in which U[i][a_0,...,a_{n-1}] is the payoff of player i"""
+    payoffs = np.asarray(payoffs,dtype=float)
+    n = payoffs.ndim - 1
+    return np.ascontiguousarray(np.moveaxis(payoffs,-1,0).transpose([0] + list(range(n,0,-1))))
+
+class payoffkernel:
+    def __init__(self,payoffs,ordered=False):
+        """precomputes the payoff tensors of all players (ordered=True if payoffs is already an array U as returned by player_tensors) and reshapes them for the contraction with the opponents' strategies"""
+        self.U = np.ascontiguousarray(payoffs,dtype=float) if ordered else player_tensors(payoffs)
+        self.n = self.U.ndim - 1#number of players
+        self.no_a = list(self.U.shape[1:])#number of actions of each player
+        self.actagg = np.concatenate(([0],np.cumsum(self.no_a))).tolist()#player i's strategy is x[actagg[i]:actagg[i+1]] in a flat profile x
+        self.V = [np.ascontiguousarray(np.moveaxis(self.U[i],i,0)).reshape(self.no_a[i],-1) for i in range(self.n)]#player i's payoffs with his own action first, the opponents' profiles flattened
+    #
+    def strategies(self,x):
+        """splits flat profiles x (shape (...,sum of no_a)) into the list of the players' strategies"""
+        x = np.asarray(x,dtype=float)
+        return [x[...,self.actagg[i]:self.actagg[i + 1]] for i in range(self.n)]
+    #
+    def action_payoffs(self,strat):
+        """returns a list with an array of player i's expected payoffs of each of his actions (shape (...,no_a[i])) if the others play strat; strat[i] itself is not used; the opponents are contracted one after the other starting with the last one (one matrix product and then batched products in which the batch is the last axis)"""
+        profiling.count('kernel_evaluations')
+        strat = [np.asarray(s,dtype=float) for s in strat]
+        batch = np.broadcast(*[s[...,0] for s in strat]).shape
+        cols = [np.broadcast_to(s,batch + s.shape[-1:]).reshape(-1,s.shape[-1]).T for s in strat]#shape (no_a[j],B)
+        out = []
+        for i in range(self.n):
+            others = [j for j in range(self.n) if j != i]
+            if others == []:
+                out.append(np.broadcast_to(self.V[i][:,0],batch + (self.no_a[i],)))
+                continue
+            last = others.pop()
+            T = self.V[i].reshape(-1,self.no_a[last]).dot(cols[last])
+            for j in others[::-1]:
+                T = np.einsum('rab,ab->rb',T.reshape(-1,self.no_a[j],T.shape[-1]),cols[j])
+            out.append(T.reshape(self.no_a[i],-1).T.reshape(batch + (self.no_a[i],)))
+        return out
+    #
+    def expected_payoffs(self,strat):
+        """expected payoff of every player if strat is played (shape (...,n))"""
+        strat = [np.asarray(s,dtype=float) for s in strat]
+        return np.stack([(u*s).sum(-1) for u, s in zip(self.action_payoffs(strat),strat)],-1)
+    #
+    def payoff_jacobian(self,strat):
+        """derivatives of the expected payoffs of all actions (see action_payoffs) at the profile strat (one profile, no batch): element [actagg[i]+a,actagg[j]+b] is the expected payoff of player i from the actions a of i and b of j if all other players play strat, i.e. the derivative of i's payoff of a with respect to the probability of b; blocks with i == j are zero"""
+        profiling.count('jacobian_evaluations')
+        strat = [np.asarray(s,dtype=float) for s in strat]
+        letters = 'abcdefghijklmnopqrstuvwxyz'[:self.n]#one index per player
+        D = np.zeros((self.actagg[-1],self.actagg[-1]))
+        for i in range(self.n):
+            for j in range(self.n):
+                if j == i:
+                    continue
+                others = [k for k in range(self.n) if k != i and k != j]
+                spec = ','.join([letters] + [letters[k] for k in others]) + '->' + letters[i] + letters[j]
+                D[self.actagg[i]:self.actagg[i + 1],self.actagg[j]:self.actagg[j + 1]] = np.einsum(spec,self.U[i],*[strat[k] for k in others])
+        return D
+    #
+    def nash_system(self,x):
+        """equilibrium conditions at the flat profile x as a vector valued system: F[actagg[i]+a] = x_ia*(max_b u_ib - u_ia) where u_i are i's payoffs of his actions; a profile in the strategy simplices is a Nash equilibrium if and only if F = 0; returns F and its Jacobian (where several actions are best responses, the derivative of the first one is used)"""
+        x = np.asarray(x,dtype=float)
+        strat = self.strategies(x)
+        u = self.action_payoffs(strat)
+        gap = np.concatenate([ui.max() - ui for ui in u])
+        D = self.payoff_jacobian(strat)
+        best = np.repeat([self.actagg[i] + int(u[i].argmax()) for i in range(self.n)],self.no_a)#row of each player's best action
+        return x*gap, np.diag(gap) + x[:,None]*(D[best] - D)
+    #
+    def deltas(self,strat):
+        """for every action of every player: the difference between the expected payoff of this action and of a best response (flat, shape (...,sum of no_a)); see Delta in Nash_eq_solver2.py"""
+        return np.concatenate([u - u.max(-1)[...,None] for u in self.action_payoffs(strat)],-1)
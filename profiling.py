@@ -0,0 +1,68 @@
+""" Timers and counters for the solvers and matching mechanisms.
+Profiling is switched on by setting the environment variable GT_PROFILE (to anything but 0) or
+inside a `with profiled():` block. When it is off, timer() returns a shared do-nothing object and
+count() returns immediately, so the hooks cost next to nothing. """
+
+import os
+import time
+from contextlib import contextmanager
+
+enabled = os.environ.get('GT_PROFILE','0') not in ('','0')
+timers = {}#name -> [total seconds, number of calls]
+counters = {}#name -> count
+
+class phase:
+    def __init__(self,name):
+        """times a phase of a computation (used as a context manager)"""
+        self.name = name
+    #
+    def __enter__(self):
+        self.start = time.time()
+        return self
+    #
+    def __exit__(self,*exc):
+        total = timers.setdefault(self.name,[0.,0])
+        total[0] = total[0] + time.time() - self.start
+        total[1] = total[1] + 1
+        return False
+
+class nophase:
+    def __enter__(self):
+        return self
+    #
+    def __exit__(self,*exc):
+        return False
+
+NOPHASE = nophase()
+
+def timer(name):
+    """context manager timing the phase name if profiling is on"""
+    return phase(name) if enabled else NOPHASE
+
+def count(name,k=1):
+    """adds k to the counter name if profiling is on"""
+    if enabled:
+        counters[name] = counters.get(name,0) + k
+
+def reset():
+    """sets all timers and counters to zero"""
+    timers.clear()
+    counters.clear()
+
+def report():
+    """dictionary with the total time and number of calls of every timer and the value of every counter"""
+    return {'timers':dict((name,{'seconds':t[0],'calls':t[1]}) for name, t in timers.items()),
+            'counters':dict(counters)}
+
+@contextmanager
+def profiled(clear=True):
+    """switches profiling on inside a with block (and resets timers and counters first if clear=True); yields the function report"""
+    global enabled
+    old = enabled
+    enabled = True
+    if clear:
+        reset()
+    try:
+        yield report
+    finally:
+        enabled = old
@@ -0,0 +1,104 @@
+""" Solving large school choice problems by zones.
+Students and schools are the nodes of the application graph: a student is linked to every school on
+his list (and for top trading cycles every school is also linked to the students in its priority
+list). Students in different connected components never compete for a seat, so every component is
+solved on its own in a pool of worker processes and the matches are merged; the result is the match
+of the sequential mechanism. """
+
+import multiprocessing
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from matching import schoolchoice, flatten, split
+import profiling
+
+def components(sc,mechanism='gs'):
+    """connected components of the application graph of the school choice problem sc; for mechanism 'ttc' the priority lists are edges too (schools point to students that did not apply); returns the number of components and the component of every student and every school"""
+    pref_arr, pref_len, prank_arr = sc.arrays()
+    listed = np.arange(pref_arr.shape[1]) < pref_len[:,None]
+    rows = [np.nonzero(listed)[0]]
+    cols = [pref_arr[listed].astype(np.int64)]
+    if mechanism == 'ttc':
+        prio_flat, prio_len = flatten(sc.priority)
+        rows.append(prio_flat.astype(np.int64))
+        cols.append(np.repeat(np.arange(sc.nschool),prio_len))
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols) + sc.nstud#schools are nodes nstud..nstud+nschool-1
+    nodes = sc.nstud + sc.nschool
+    graph = coo_matrix((np.ones(len(rows),dtype=np.int8),(rows,cols)),shape=(nodes,nodes))
+    ncomp, label = connected_components(graph,directed=False)
+    return ncomp, label[:sc.nstud], label[sc.nstud:]
+
+def subproblems(sc,stud_label,school_label,mechanism='gs'):
+    """splits sc into one problem per component; students and schools are renumbered within their component keeping their order, so every component is solved exactly as in the whole problem; returns a list of (students, schools, (priority, capacity, preference)) with the global numbers of the students and schools of each component (components without school are left out, their students stay unmatched)"""
+    pref_arr, pref_len, prank_arr = sc.arrays()
+    prio_flat, prio_len = flatten(sc.priority)
+    prio_off = np.concatenate(([0],np.cumsum(prio_len,dtype=np.int64))).tolist()
+    stud_order = np.argsort(stud_label,kind='mergesort')#stable: keeps the order of students within a component
+    school_order = np.argsort(school_label,kind='mergesort')
+    ncomp = max(stud_label.max() if len(stud_label) > 0 else -1,school_label.max() if len(school_label) > 0 else -1) + 1
+    stud_bounds = np.searchsorted(stud_label[stud_order],np.arange(ncomp + 1)).tolist()
+    school_bounds = np.searchsorted(school_label[school_order],np.arange(ncomp + 1)).tolist()
+    local = np.empty(sc.nstud + sc.nschool,dtype=np.int64)#number of every student and school within its component
+    local[stud_order] = np.arange(sc.nstud) - np.repeat(stud_bounds[:-1],np.diff(stud_bounds))
+    local[sc.nstud + school_order] = np.arange(sc.nschool) - np.repeat(school_bounds[:-1],np.diff(school_bounds))
+    listed = np.arange(pref_arr.shape[1]) < pref_len[:,None]
+    local_pref = np.where(listed,local[sc.nstud + np.maximum(pref_arr,0)],-1)#preferences in the numbers of the components
+    capacity = np.asarray(sc.capacity)
+    out = []
+    for c in range(ncomp):
+        schools = school_order[school_bounds[c]:school_bounds[c + 1]]
+        if len(schools) == 0:
+            continue
+        studs = stud_order[stud_bounds[c]:stud_bounds[c + 1]]
+        lengths = pref_len[studs]
+        preference = split(local_pref[studs][listed[studs]],np.concatenate(([0],np.cumsum(lengths,dtype=np.int64))))
+        priority = []
+        for k in schools:
+            prio = prio_flat[prio_off[k]:prio_off[k + 1]]
+            if mechanism != 'ttc':#students of other components never apply to k
+                prio = prio[stud_label[prio] == c]
+            priority.append(local[prio])
+        out.append((studs,schools,(priority,capacity[schools],preference)))
+    return out
+
+def solve_shard(task):
+    """worker: solves a batch of problems; task is a tuple (mechanism, problems) with problems a list of (priority, capacity, preference); returns the list of matches"""
+    mechanism, problems = task
+    return [getattr(schoolchoice(*problem),mechanism)() for problem in problems]
+
+def sharded(sc,mechanism='gs',processes=None,max_share=0.5,batch=10000):
+    """solves the school choice problem sc with mechanism ('gs', 'ttc' or 'boston') component by component in a pool of processes worker processes (default: one per cpu; 1: no pool); components are sent to the workers in batches of about batch students; if the largest component contains more than the fraction max_share of the students, splitting does not pay and the whole problem is solved in this process; the match is the match of the mechanism on the whole problem and saved like the match of the method of sc; returns the match and a dictionary with the number of components, the size of the largest and whether the problem was split"""
+    with profiling.timer('shard_components'):
+        ncomp, stud_label, school_label = components(sc,mechanism)
+    sizes = np.bincount(stud_label,minlength=ncomp)
+    stats = {'components':ncomp,'largest':int(sizes.max()) if sc.nstud > 0 else 0,'split':False}
+    if ncomp < 2 or stats['largest'] > max_share*sc.nstud:#one (almost) connected problem
+        return getattr(sc,mechanism)(), stats
+    stats['split'] = True
+    with profiling.timer('shard_split'):
+        parts = subproblems(sc,stud_label,school_label,mechanism)
+    tasks = []
+    size = 0
+    for studs, schools, problem in parts:
+        if tasks == [] or size + len(studs) > batch:
+            tasks.append((mechanism,[]))
+            size = 0
+        tasks[-1][1].append(problem)
+        size = size + len(studs)
+    with profiling.timer('shard_solve'):
+        if processes == 1:
+            results = [solve_shard(task) for task in tasks]
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = pool.map(solve_shard,tasks)
+            finally:
+                pool.terminate()
+    match = [[] for k in range(sc.nschool)]
+    matches = [m for result in results for m in result]
+    for (studs, schools, problem), local_match in zip(parts,matches):
+        for k, local_studs in zip(schools,local_match):
+            match[k] = studs[local_studs].tolist()
+    setattr(sc,mechanism + '_match',list(match))
+    return match, stats
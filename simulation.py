@@ -0,0 +1,140 @@
+
+import os
+import glob
+import json
+import time
+import random
+import itertools
+import multiprocessing
+import numpy as np
+from matching import gen_sc, schoolchoice
+from analysis import matchcheck
+
+def expand_grid(grid):
+    """turns a dictionary of parameter lists, e.g. {'nschool':[10,50],'nstud':[1000]}, into the list of all parameter combinations (each a dictionary); keys are used in alphabetical order so that the list is always the same"""
+    keys = sorted(grid.keys())
+    return [dict(zip(keys,values)) for values in itertools.product(*[grid[key] for key in keys])]
+
+def task_seed(seed,cell,rep):
+    """seed of replication rep in grid cell cell; it only depends on these numbers (and not on the worker that runs the replication), so results are reproducible"""
+    return (seed*1000003 + cell*10007 + rep) % 2**31
+
+def match_stats(sc,match,nschool,width):
+    """statistics of a match: rank distribution (how many students got their 1st, 2nd,... choice; width entries), number of students getting their first choice, number of unmatched students (students at a dummy school with number >= nschool count as unmatched), mean rank of the matched and the number of blocking pairs"""
+    check = matchcheck(sc,match)
+    assigned, pos = check.assigned, check.pos
+    real = (assigned >= 0) & (assigned < nschool)
+    hist = np.bincount(pos[real],minlength=width)[:width]
+    return {'rank_hist':hist,
+            'first_choice':int(hist[0]) if width > 0 else 0,
+            'unmatched':int(sc.nstud - real.sum()),
+            'mean_rank':float(pos[real].mean() + 1) if real.any() else 0.,
+            'blocking_pairs':len(check.blocking_pairs())}
+
+def run_instance(task):
+    """runs one replication: task is a tuple (task id, grid cell, replication, parameters, seed, mechanisms, width); generates a problem with gen_sc and returns a list with one row of statistics (a dictionary) for each mechanism"""
+    task_id, cell, rep, params, seed, mechanisms, width = task
+    random.seed(seed)
+    np.random.seed(seed)
+    priority, capacity, preference = gen_sc(params['nschool'],params['nstud'],params.get('overcap',False),params.get('maxovercap',False))
+    sc = schoolchoice(priority,capacity,preference)
+    sc.arrays()#shared by all mechanisms; built before the timing so that the first mechanism does not pay for it
+    rows = []
+    for mechanism in mechanisms:
+        start = time.time()
+        match = getattr(sc,mechanism)()
+        runtime = time.time() - start
+        row = match_stats(sc,match,params['nschool'],width)
+        row.update({'task':task_id,'cell':cell,'rep':rep,'seed':seed,'nschool':params['nschool'],'nstud':params['nstud'],'mechanism':mechanism,'runtime':runtime})
+        rows.append(row)
+    return rows
+
+def write_chunk(outdir,number,rows):
+    """writes rows (list of dictionaries with the same keys) column by column into outdir/chunk_<number>.npz; the file is renamed only when complete, so an interrupted run never leaves a broken chunk"""
+    columns = {}
+    for key in rows[0]:
+        columns[key] = np.array([row[key] for row in rows])
+    name = os.path.join(outdir,'chunk_%05d' % number)
+    np.savez(name + '.tmp.npz',**columns)
+    os.rename(name + '.tmp.npz',name + '.npz')
+
+def done_tasks(outdir):
+    """task ids of all replications already saved in outdir and the number of saved chunks"""
+    done = set()
+    files = sorted(glob.glob(os.path.join(outdir,'chunk_*[0-9].npz')))
+    for name in files:
+        with np.load(name) as chunk:
+            done.update(chunk['task'].tolist())
+    return done, len(files)
+
+def simulate(grid,reps,outdir,mechanisms=('gs','ttc','boston'),processes=None,seed=0,chunksize=100):
+    """Monte Carlo comparison of matching mechanisms: for every parameter combination in grid (a dictionary of lists with keys nschool, nstud and optionally overcap and maxovercap; see gen_sc) reps random problems are generated and solved by every mechanism; replications are spread over a pool of processes (default: one per cpu) and results are saved in chunks of chunksize replications in the directory outdir; calling simulate again with the same arguments resumes an interrupted run; returns the number of replications run"""
+    cells = expand_grid(grid)
+    meta = {'grid':grid,'reps':reps,'mechanisms':list(mechanisms),'seed':seed}
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    meta_file = os.path.join(outdir,'meta.json')
+    if os.path.exists(meta_file):
+        with open(meta_file,'r') as f:
+            if json.load(f) != json.loads(json.dumps(meta)):
+                raise ValueError('%s contains results of a different simulation' % outdir)
+    else:
+        with open(meta_file,'w') as f:
+            json.dump(meta,f)
+    width = max(params['nschool'] for params in cells)#length of the rank distribution
+    done, number = done_tasks(outdir)
+    tasks = []
+    for cell in range(len(cells)):
+        for rep in range(reps):
+            task_id = cell*reps + rep
+            if task_id not in done:
+                tasks.append((task_id,cell,rep,cells[cell],task_seed(seed,cell,rep),tuple(mechanisms),width))
+    pool = multiprocessing.Pool(processes)
+    buf = []#rows not yet written
+    count = 0
+    try:
+        for rows in pool.imap_unordered(run_instance,tasks):
+            buf.extend(rows)
+            count = count + 1
+            if count % chunksize == 0:
+                write_chunk(outdir,number,buf)
+                number = number + 1
+                buf = []
+        if buf != []:
+            write_chunk(outdir,number,buf)
+    finally:
+        pool.terminate()
+    return count
+
+def load_results(outdir,columns=None):
+    """reads all chunks in outdir and returns a dictionary of arrays (one per column, all columns if columns is None)"""
+    parts = {}
+    for name in sorted(glob.glob(os.path.join(outdir,'chunk_*[0-9].npz'))):
+        with np.load(name) as chunk:
+            for key in (columns or chunk.files):
+                parts.setdefault(key,[]).append(chunk[key])
+    return dict((key,np.concatenate(value)) for key, value in parts.items())
+
+def summarize(outdir):
+    """averages of the statistics per parameter combination and mechanism; reads one chunk at a time, so memory does not grow with the number of replications; returns a list of dictionaries (parameters, mechanism, number of replications and averages)"""
+    with open(os.path.join(outdir,'meta.json'),'r') as f:
+        cells = expand_grid(json.load(f)['grid'])
+    stats = ['runtime','first_choice','unmatched','mean_rank','blocking_pairs']
+    sums = {}
+    for name in sorted(glob.glob(os.path.join(outdir,'chunk_*[0-9].npz'))):
+        with np.load(name) as chunk:
+            columns = dict((key,chunk[key].tolist()) for key in stats + ['cell','mechanism'])
+        for row in range(len(columns['cell'])):
+            total = sums.setdefault((columns['cell'][row],str(columns['mechanism'][row])),dict((stat,0.) for stat in stats + ['reps']))
+            total['reps'] = total['reps'] + 1
+            for stat in stats:
+                total[stat] = total[stat] + columns[stat][row]
+    out = []
+    for key in sorted(sums):
+        total = sums[key]
+        row = dict(cells[key[0]])
+        row.update({'mechanism':key[1],'reps':int(total['reps'])})
+        for stat in stats:
+            row[stat] = total[stat]/total['reps']
+        out.append(row)
+    return out